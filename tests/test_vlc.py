@@ -0,0 +1,1119 @@
+"""
+Tests for the parts of vlc.py that don't need a running VLC.
+
+Run with: python -m pytest -q (or python -m unittest discover tests)
+"""
+
+import http.server
+import io
+import json
+import os
+import pathlib
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from unittest import mock
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+import vlc  # noqa: E402
+
+
+class FakeRC:
+    """
+    Answer rc commands on one end of a socketpair, like VLC does.
+
+    <answers> maps commands to their output or to a function returning it.
+        Commands without output get a bare prompt, unknown commands the
+        complaint of VLC.
+    """
+
+    GREETING = (b"VLC media player 3.0.18 Vetinari\r\n"
+                b"Command Line Interface initialized. "
+                b"Type `help' for help.\r\n> ")
+
+    def __init__(self, answers=None) -> None:
+        self.answers = dict(answers or {})
+        self.commands = list()
+        self.client, self._server = socket.socketpair()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        try:
+            self._server.sendall(self.GREETING)
+            for line in self._server.makefile('rb'):
+                self._answer(line.decode('utf-8').strip())
+        except OSError:
+            # the client went away
+            pass
+
+    def _answer(self, command: str):
+        self.commands.append(command)
+        answer = self.answers.get(command)
+        if callable(answer):
+            answer = answer(command)
+        if answer is None:
+            answer = "Unknown command `%s'. Type `help' for help." % command
+        if answer:
+            answer += '\r\n'
+        self._server.sendall(answer.encode('utf-8') + b'> ')
+
+    def close(self):
+        self.client.close()
+        self._server.close()
+
+
+def _player(test: unittest.TestCase, fake: FakeRC=None, **kwargs):
+    """Create a VLC talking rc to <fake>, closed when <test> ends."""
+    fake = fake or FakeRC()
+    test.addCleanup(fake.close)
+    with mock.patch.object(vlc.VLC, '_connect', return_value=fake.client):
+        return vlc.VLC(screen_name=None, **kwargs)
+
+
+def _playlist_document(items, library=None) -> dict:
+    """Build a document shaped like playlist.json of VLC."""
+    return {
+        'type': 'node',
+        'name': '',
+        'children': [
+            {'type': 'node', 'name': 'Playlist', 'id': '1',
+             'children': items},
+            {'type': 'node', 'name': 'Media Library', 'id': '2',
+             'children': library or []},
+        ],
+    }
+
+
+def _split(data: bytes, sizes) -> list:
+    """Cut <data> into chunks of the given <sizes>, repeating the last."""
+    chunks = list()
+    pos = 0
+    for size in sizes:
+        chunks.append(data[pos:pos + size])
+        pos += size
+    while pos < len(data):
+        chunks.append(data[pos:pos + sizes[-1]])
+        pos += sizes[-1]
+    return chunks
+
+
+class IterJsonItemsTest(unittest.TestCase):
+
+    ITEMS = [
+        {'type': 'leaf', 'id': '4', 'name': 'plain', 'duration': 10,
+         'uri': 'file:///tmp/plain.mp3'},
+        {'type': 'leaf', 'id': '5', 'name': 'say "hi" {to} [all], \\o/',
+         'duration': -1, 'uri': 'http://host/a?b=1&c=2'},
+        {'type': 'leaf', 'id': '6', 'name': 'Grüße \u266b \U0001f3b5',
+         'duration': 3, 'current': 'current'},
+        {'type': 'node', 'id': '7', 'name': 'folder',
+         'children': [{'type': 'leaf', 'id': '8', 'name': 'nested'}]},
+    ]
+    LIBRARY = [{'type': 'leaf', 'id': '9', 'name': 'skipped }]'}]
+
+    def decode(self, chunks) -> list:
+        return list(vlc._iter_json_items(chunks,
+                                         vlc.VLC.PLAYLIST_ITEMS_PATH))
+
+    def encode(self, document) -> bytes:
+        return json.dumps(document, ensure_ascii=False).encode('utf-8')
+
+    def test_whole_document(self):
+        data = self.encode(_playlist_document(self.ITEMS, self.LIBRARY))
+        self.assertEqual(self.decode([data]), self.ITEMS)
+
+    def test_single_byte_chunks(self):
+        data = self.encode(_playlist_document(self.ITEMS, self.LIBRARY))
+        self.assertEqual(self.decode(_split(data, [1])), self.ITEMS)
+
+    def test_random_chunks(self):
+        data = self.encode(_playlist_document(self.ITEMS, self.LIBRARY))
+        generator = random.Random(0)
+        for _ in range(200):
+            sizes = [generator.randint(1, 40) for _ in range(len(data))]
+            self.assertEqual(self.decode(_split(data, sizes)), self.ITEMS)
+
+    def test_multibyte_character_split(self):
+        data = self.encode(_playlist_document(self.ITEMS))
+        # cut right inside the four bytes of the emoji
+        cut = data.index('\U0001f3b5'.encode('utf-8')) + 2
+        self.assertEqual(self.decode([data[:cut], data[cut:]]), self.ITEMS)
+
+    def test_indented_document(self):
+        data = json.dumps(_playlist_document(self.ITEMS, self.LIBRARY),
+                          indent=4).encode('utf-8')
+        self.assertEqual(self.decode(_split(data, [7])), self.ITEMS)
+
+    def test_skips_media_library(self):
+        data = self.encode(_playlist_document([], self.LIBRARY))
+        self.assertEqual(self.decode(_split(data, [3])), [])
+
+    def test_empty_playlist(self):
+        data = self.encode(_playlist_document([]))
+        self.assertEqual(self.decode([data]), [])
+
+    def test_incomplete_document(self):
+        data = self.encode(_playlist_document(self.ITEMS))
+        for cut in (len(data) // 2, len(data) - 1):
+            with self.assertRaises(ValueError):
+                self.decode(_split(data[:cut], [5]))
+
+
+class CommandCoalescerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = vlc.CommandCoalescer(window=0.05)
+        self.sent = list()
+
+    def send(self, value, delta):
+        self.sent.append((value, delta))
+        return len(self.sent)
+
+    def submit_all(self, *submissions) -> list:
+        futures = [self.coalescer.submit('key', self.send, value, delta)
+                   for value, delta in submissions]
+        return [future.result(timeout=5) for future in futures]
+
+    def test_latest_value_wins(self):
+        results = self.submit_all((10, 0), (20, 0), (30, 0))
+        self.assertEqual(self.sent, [(30, 0)])
+        self.assertEqual(results, [1, 1, 1])
+
+    def test_relative_steps_are_summed(self):
+        self.submit_all((None, 5), (None, 5), (None, -2))
+        self.assertEqual(self.sent, [(None, 8)])
+
+    def test_step_after_value(self):
+        self.submit_all((100, 0), (None, 10), (None, 10))
+        self.assertEqual(self.sent, [(100, 20)])
+
+    def test_value_drops_earlier_steps(self):
+        self.submit_all((None, 10), (100, 0), (None, 1))
+        self.assertEqual(self.sent, [(100, 1)])
+
+    def test_keys_are_separate(self):
+        first = self.coalescer.submit('seek', self.send, 1)
+        second = self.coalescer.submit('volume', self.send, None, 2)
+        first.result(timeout=5)
+        second.result(timeout=5)
+        self.assertEqual(sorted(self.sent, key=str), [(1, 0), (None, 2)])
+
+    def test_bursts_after_window(self):
+        self.submit_all((1, 0))
+        self.submit_all((2, 0))
+        self.assertEqual(self.sent, [(1, 0), (2, 0)])
+
+    def test_flush(self):
+        coalescer = vlc.CommandCoalescer(window=60)
+        future = coalescer.submit('key', self.send, None, 3)
+        coalescer.flush()
+        self.assertTrue(future.done())
+        self.assertEqual(self.sent, [(None, 3)])
+
+    def test_errors_reach_all_futures(self):
+        def fail(value, delta):
+            raise OSError("unreachable")
+
+        futures = [self.coalescer.submit('key', fail, value)
+                   for value in (1, 2)]
+        for future in futures:
+            with self.assertRaises(OSError):
+                future.result(timeout=5)
+
+
+class CoalescingPlayerTest(unittest.TestCase):
+
+    def test_timeout_reaches_coalesced_send(self):
+        player = _player(self, coalesce_window=0.05)
+
+        def _http_seek(time):
+            # what every call to VLC checks before waiting for an answer
+            player._remaining(player._deadline(), player._generation)
+
+        player._http_seek = _http_seek
+        with self.assertRaises(vlc.VLCTimeout):
+            player.seek(3, timeout=0.01).result(timeout=5)
+        self.assertIsNone(player.seek(4, timeout=5).result(timeout=5))
+
+
+class RCPlaylistTest(unittest.TestCase):
+
+    HEAD = ['+----[ Playlist - playlist ]', '| 2 - Playlist']
+    TAIL = ['| 3 - Media Library', '+----[ End of playlist ]']
+    GOOD = ['|   4 - Song A (00:03:20) [played 2 time]',
+            '|   5 - Song B > C (01:00:33)']
+    CORRUPTED = ['|   6 - Broken (00:0', '|   7 - No duration']
+    UNPARSABLE = ['|   garbage']
+
+    def setUp(self):
+        self.fake = FakeRC({'playlist': self.playlist,
+                            'delete 6': '', 'delete 7': ''})
+        self.player = _player(self, self.fake, dual_interface=True,
+                              timeout=2)
+
+    def playlist(self, command) -> str:
+        lines = list(self.GOOD)
+        deleted = set(self.fake.commands)
+        lines += [line for line, id in zip(self.CORRUPTED, (6, 7))
+                  if 'delete %i' % id not in deleted]
+        return '\r\n'.join(self.HEAD + lines + self.UNPARSABLE + self.TAIL)
+
+    def test_parse_entry(self):
+        self.assertEqual(self.player._rc_parse_playlist_entry(self.GOOD[0]),
+                         {'id': 4, 'title': 'Song A', 'length': 200,
+                          'played': 2})
+        self.assertEqual(self.player._rc_parse_playlist_entry(self.GOOD[1]),
+                         {'id': 5, 'title': 'Song B > C', 'length': 3633,
+                          'played': 0})
+
+    def test_parse_corrupted_entry(self):
+        for entry in self.CORRUPTED + self.UNPARSABLE:
+            with self.assertRaises((ValueError, IndexError)):
+                self.player._rc_parse_playlist_entry(entry)
+
+    def test_read_playlist(self):
+        plist, corrupted, unparsable = self.player._rc_read_playlist()
+        self.assertEqual([entry['id'] for entry in plist], [4, 5])
+        self.assertEqual(corrupted, list(zip((6, 7), self.CORRUPTED)))
+        self.assertEqual(unparsable, self.UNPARSABLE)
+
+    def test_delete_batch_reads_bare_prompts(self):
+        self.player._rc_delete_batch([6, 7])
+        self.assertEqual(self.fake.commands[-2:], ['delete 6', 'delete 7'])
+        # the stream is still in sync for the next command
+        self.assertEqual(len(self.player._rc_read_playlist()[0]), 2)
+
+    def test_prompts_split_across_reads(self):
+        chunks = iter([b'> >', b' > ', b'x\r\n', b'> '])
+        self.player._rc_recv = lambda *args: next(chunks)
+        self.assertEqual(self.player._rc_recv_prompts(4, None, 0),
+                         b'> > > x\r\n> ')
+
+    def test_repair(self):
+        reports = list()
+        self.player.PLAYLIST_REPAIR_CALLBACK = reports.append
+        plist = self.player._rc_playlist()
+        self.assertEqual([entry['id'] for entry in plist], [4, 5])
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0]['removed'], [6, 7])
+        self.assertEqual(reports[0]['remaining'], [])
+        self.assertEqual(reports[0]['unparsable'], self.UNPARSABLE)
+
+class TraceTest(unittest.TestCase):
+
+    ROWS = [
+        (1000.5, 'http', 'requests/status.json?command=seek&val=3', 512,
+         0.0125),
+        (1001.25, 'rc', 'add "a, b".mp3', 0, 0.001),
+    ]
+
+    def expected(self) -> list:
+        return [dict(zip(vlc.TraceRecorder.FIELDS, row)) for row in self.ROWS]
+
+    def test_round_trip(self):
+        file = io.StringIO()
+        recorder = vlc.TraceRecorder(file)
+        for row in self.ROWS:
+            recorder.record(*row)
+        recorder.close()
+        file.seek(0)
+        self.assertEqual(vlc.read_trace(file), self.expected())
+
+    def test_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.csv')
+            recorder = vlc.TraceRecorder(path)
+            for row in self.ROWS:
+                recorder.record(*row)
+            recorder.close()
+            with open(path, newline='') as file:
+                self.assertEqual(vlc.read_trace(file), self.expected())
+
+    def test_player_records_commands(self):
+        file = io.StringIO()
+        player = _player(self, FakeRC({'get_time': '42'}),
+                         dual_interface=True, timeout=2,
+                         recorder=vlc.TraceRecorder(file))
+        self.assertEqual(player._rc_get_time(), 42)
+        file.seek(0)
+        trace = vlc.read_trace(file)
+        self.assertEqual([(entry['interface'], entry['command'])
+                          for entry in trace], [('rc', 'get_time')])
+        self.assertGreater(trace[0]['size'], 0)
+
+    def test_replay(self):
+        fake = FakeRC({'pause': '', 'get_time': '42'})
+        player = _player(self, fake, dual_interface=True, timeout=2)
+        trace = [
+            {'timestamp': 0.0, 'interface': 'rc', 'command': 'pause',
+             'size': 0, 'latency': 0.001},
+            {'timestamp': 0.01, 'interface': 'rc', 'command': 'get_time',
+             'size': 4, 'latency': 0.001},
+        ]
+        result = vlc.replay_trace(trace, player, speed=None)
+        self.assertEqual((result['sent'], result['skipped'],
+                          result['errors']), (2, 0, 0))
+        self.assertEqual(fake.commands[-2:], ['pause', 'get_time'])
+        self.assertIsNotNone(result['latency']['p99'])
+
+    def test_replay_skips_other_interface(self):
+        player = _player(self, interfaces=['rc'])
+        trace = [{'timestamp': 0.0, 'interface': 'http',
+                  'command': 'requests/status.json', 'size': 10,
+                  'latency': 0.001}]
+        result = vlc.replay_trace(trace, player, speed=None)
+        self.assertEqual((result['sent'], result['skipped']), (0, 1))
+
+class InterfaceRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.router = vlc.InterfaceRouter(['rc', 'http'], alpha=0.5,
+                                          probe_every=4, cooldown=60)
+
+    def test_unmeasured_first(self):
+        self.router.measured('next', 'rc', 0.01)
+        self.assertEqual(self.router.candidates('next'), ['http', 'rc'])
+
+    def test_fastest_first(self):
+        self.router.measured('next', 'rc', 0.01)
+        self.router.measured('next', 'http', 0.002)
+        self.assertEqual(self.router.candidates('next'), ['http', 'rc'])
+        # with alpha 0.5 one slow answer moves the average halfway
+        self.router.measured('next', 'http', 0.03)
+        self.assertEqual(self.router.latency[('next', 'http')], 0.016)
+        self.assertEqual(self.router.candidates('next'), ['rc', 'http'])
+
+    def test_probe_runner_up(self):
+        self.router.measured('next', 'rc', 0.01)
+        self.router.measured('next', 'http', 0.02)
+        orders = [self.router.candidates('next') for _ in range(4)]
+        self.assertEqual(orders[:3], [['rc', 'http']] * 3)
+        self.assertEqual(orders[3], ['http', 'rc'])
+
+    def test_failed_goes_last(self):
+        self.router.measured('next', 'rc', 0.01)
+        self.router.measured('next', 'http', 0.02)
+        self.router.failed('rc')
+        self.assertEqual(self.router.candidates('next'), ['http', 'rc'])
+        # a successful call brings it back
+        self.router.measured('next', 'rc', 0.01)
+        self.assertEqual(self.router.candidates('next'), ['rc', 'http'])
+
+    def test_unable(self):
+        self.router.unable('stats', 'rc')
+        self.assertEqual(self.router.candidates('stats'), ['http'])
+        self.assertEqual(self.router.candidates('next'), ['rc', 'http'])
+
+
+class RouteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = _player(self, dual_interface=True, timeout=2)
+        self.calls = list()
+
+    def stubs(self, command: str, rc=None, http=None):
+        """Create rc and http stubs named like the methods of <command>."""
+        def stub(interface, behaviour):
+            def do(*args):
+                self.calls.append(interface)
+                if isinstance(behaviour, Exception):
+                    raise behaviour
+                return behaviour
+            do.__name__ = '_%s_%s' % (interface, command)
+            return do
+        return stub('rc', rc), stub('http', http)
+
+    def test_routes_to_faster_interface(self):
+        self.player.ROUTER.measured('get_time', 'rc', 0.001)
+        self.player.ROUTER.measured('get_time', 'http', 0.01)
+        rc, http = self.stubs('get_time', rc=1, http=2)
+        self.assertEqual(self.player._route(rc, http), 1)
+        self.assertEqual(self.calls, ['rc'])
+
+    def test_read_only_fails_over(self):
+        rc, http = self.stubs('get_time', rc=OSError('reset'), http=2)
+        self.assertEqual(self.player._route(rc, http), 2)
+        self.assertEqual(self.calls, ['rc', 'http'])
+        self.assertEqual(self.player.ROUTER.candidates('get_time'),
+                         ['http', 'rc'])
+
+    def test_commands_are_not_repeated(self):
+        rc, http = self.stubs('next', rc=ValueError('parse'), http=None)
+        with self.assertRaises(ValueError):
+            self.player._route(rc, http)
+        self.assertEqual(self.calls, ['rc'])
+
+    def test_timeout_does_not_fail_over(self):
+        rc, http = self.stubs('get_time', rc=vlc.VLCTimeout('slow'), http=2)
+        with self.assertRaises(vlc.VLCTimeout):
+            self.player._route(rc, http)
+        self.assertEqual(self.calls, ['rc'])
+
+    def test_unable_interface(self):
+        rc, http = self.stubs('stats', rc=NotImplementedError(), http=3)
+        self.assertEqual(self.player._route(rc, http), 3)
+        self.assertEqual(self.player.ROUTER.candidates('stats'), ['http'])
+
+    def test_volume_uses_http(self):
+        for command in ('set_volume', 'volup', 'voldown'):
+            rc, http = self.stubs(command, rc=1, http=2)
+            self.assertEqual(self.player._route(rc, http), 2)
+        self.assertEqual(self.calls, ['http'] * 3)
+
+class FakePlaylistPlayer:
+    """Just enough of VLC for a QueueFeeder, ids count up from 100."""
+
+    def __init__(self) -> None:
+        self.playlist = list()
+        self.current = -1
+        self.played = list()
+        self._ids = 100
+
+    def get_cached_playlist(self) -> list:
+        return [{'id': str(id), 'uri': mrl} for id, mrl in self.playlist]
+
+    def enqueue(self, mrl):
+        self._ids += 1
+        self.playlist.append((self._ids, mrl))
+
+    def delete(self, id):
+        self.playlist = [item for item in self.playlist if item[0] != id]
+
+    def play(self, id):
+        self.current = id
+        self.played.append(id)
+
+    def status(self) -> dict:
+        return {'currentplid': self.current}
+
+    def ids(self) -> list:
+        return [id for id, mrl in self.playlist]
+
+
+class QueueFeederTest(unittest.TestCase):
+
+    def setUp(self):
+        self.player = FakePlaylistPlayer()
+        self.feeder = vlc.QueueFeeder(self.player,
+                                      ['item%i' % i for i in range(8)],
+                                      ahead=2, behind=1)
+
+    def test_start(self):
+        self.feeder.start()
+        self.assertEqual(self.feeder.window, [101, 102, 103])
+        self.assertEqual(self.player.played, [101])
+
+    def test_advance(self):
+        self.feeder.start()
+        self.player.current = 103
+        self.assertEqual(self.feeder.step(), 103)
+        # one played item stays, two are kept ahead
+        self.assertEqual(self.feeder.window, [102, 103, 104, 105])
+        self.assertEqual(self.player.ids(), [102, 103, 104, 105])
+
+    def test_end_of_playlist(self):
+        self.feeder.start()
+        self.player.current = -1
+        self.assertEqual(self.feeder.step(), 104)
+        self.assertEqual(self.feeder.window, [103, 104, 105, 106])
+        self.assertEqual(self.player.played, [101, 104])
+
+    def test_foreign_item(self):
+        self.feeder.start()
+        self.player.enqueue('chosen by the user')
+        self.player.play(104)
+        self.assertEqual(self.feeder.step(), 104)
+        self.assertEqual(self.feeder.window, [101, 102, 103])
+        self.assertEqual(self.player.ids(), [101, 102, 103, 104])
+        self.assertEqual(self.player.played, [101, 104])
+
+    def test_drained(self):
+        self.feeder.start()
+        while not self.feeder.exhausted:
+            self.player.current = self.feeder.window[-1]
+            self.feeder.step()
+        self.player.current = self.feeder.window[-1]
+        self.assertTrue(self.feeder.finished(self.feeder.step()))
+        self.player.current = -1
+        self.assertEqual(self.feeder.step(), -1)
+        self.assertTrue(self.feeder.drained)
+        self.assertEqual(self.feeder.window, [108])
+
+    def test_run_returns(self):
+        self.player.status = lambda: {'currentplid': -1}
+        thread = threading.Thread(target=self.feeder.run,
+                                  kwargs={'interval': 0.001})
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(self.feeder.drained)
+
+class SlowHTTPServer(http.server.ThreadingHTTPServer):
+    """Serve <body> for every request, in pieces every <delay> seconds."""
+
+    daemon_threads = True
+
+    def __init__(self, body: bytes, delay: float=0.0) -> None:
+        super().__init__(('127.0.0.1', 0), _SlowHandler)
+        self.body = body
+        self.delay = delay
+        self.clients = set()
+        threading.Thread(target=self.serve_forever, args=(0.01, ),
+                         daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SlowHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        try:
+            for pos in range(0, len(self.server.body), 256):
+                time.sleep(self.server.delay)
+                self.wfile.write(self.server.body[pos:pos + 256])
+                self.wfile.flush()
+        except OSError:
+            # the client aborted
+            pass
+
+
+class DeadlineTest(unittest.TestCase):
+
+    BODY = json.dumps(_playlist_document(
+        [{'id': str(id), 'name': 'item'} for id in range(100)])).encode()
+
+    def setUp(self):
+        self.server = SlowHTTPServer(self.BODY)
+        self.addCleanup(self.server.close)
+        self.player = _player(self, http_host='127.0.0.1',
+                              http_port=self.server.server_address[1],
+                              timeout=None)
+
+    def test_nested_deadlines(self):
+        self.assertIsNone(self.player._deadline())
+        with self.player.deadline(10):
+            with self.player.deadline(1):
+                self.assertLess(self.player._deadline(),
+                                time.monotonic() + 1)
+            with self.player.deadline(100):
+                # inner deadlines can't extend the outer one
+                self.assertLess(self.player._deadline(),
+                                time.monotonic() + 10)
+        self.assertIsNone(self.player._deadline())
+
+    def test_default_timeout(self):
+        self.player.TIMEOUT = 5
+        self.assertLess(self.player._deadline(), time.monotonic() + 5)
+
+    def test_remaining(self):
+        with self.assertRaises(vlc.VLCTimeout):
+            self.player._remaining(time.monotonic() - 1,
+                                   self.player._generation)
+        generation = self.player._generation
+        self.player.cancel()
+        with self.assertRaises(vlc.VLCCancelled):
+            self.player._remaining(None, generation)
+
+    def test_keeps_connection_alive(self):
+        for _ in range(3):
+            self.player._http_get('requests/status.json')
+        self.assertEqual(len(list(self.player._http_iter_playlist())), 100)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_deadline_covers_stream(self):
+        # every read is fast, the whole download takes about a second
+        self.server.delay = 0.05
+        start = time.monotonic()
+        with self.assertRaises(vlc.VLCTimeout):
+            with self.player.deadline(0.3):
+                list(self.player._http_iter_playlist())
+        self.assertLess(time.monotonic() - start, 0.8)
+
+    def test_timeout_keyword(self):
+        self.server.delay = 0.05
+        start = time.monotonic()
+        with self.assertRaises(vlc.VLCTimeout):
+            self.player.get_playlist(timeout=0.3)
+        self.assertLess(time.monotonic() - start, 0.8)
+
+    def test_cancel_without_deadline(self):
+        self.server.delay = 0.05
+        threading.Timer(0.2, self.player.cancel).start()
+        start = time.monotonic()
+        with self.assertRaises(vlc.VLCCancelled):
+            self.player._http_get('requests/playlist.json')
+        self.assertLess(time.monotonic() - start, 0.7)
+        # the next call works again
+        self.server.delay = 0.0
+        self.assertEqual(len(list(self.player._http_iter_playlist())), 100)
+
+    def test_cancel_stream(self):
+        self.server.delay = 0.05
+        threading.Timer(0.2, self.player.cancel).start()
+        with self.assertRaises(vlc.VLCCancelled):
+            list(self.player._http_iter_playlist())
+
+class SharedStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.name = 'test-%s' % uuid.uuid4().hex
+        self.writer = vlc.SharedStatus(self.name, size=4096)
+        self.reader = vlc.SharedStatus(self.name, size=4096)
+
+    def tearDown(self):
+        self.writer.close()
+        self.reader.close()
+        os.unlink(self.writer.path)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.reader.read())
+        self.writer.write({'status': {'state': 'playing'}})
+        self.assertEqual(self.reader.read(),
+                         {'status': {'state': 'playing'}})
+
+    def test_stale_data(self):
+        self.writer.write({'state': 'playing'})
+        self.reader.max_age = 0.0
+        time.sleep(0.01)
+        self.assertIsNone(self.reader.read())
+
+    def test_retries_while_writing(self):
+        self.writer.write({'state': 'playing'})
+        sequence = self.writer.SEQUENCE.unpack_from(self.writer._map)[0]
+        # pretend a write is in progress
+        self.writer.SEQUENCE.pack_into(self.writer._map, 0, sequence + 1)
+        self.assertIsNone(self.reader.read(retries=10))
+
+        def finish():
+            time.sleep(0.02)
+            self.writer.SEQUENCE.pack_into(self.writer._map, 0, sequence + 2)
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        try:
+            self.assertEqual(self.reader.read(retries=10 ** 9),
+                             {'state': 'playing'})
+        finally:
+            thread.join()
+
+    def test_no_torn_reads(self):
+        stop = threading.Event()
+
+        def write():
+            number = 0
+            while not stop.is_set():
+                number += 1
+                self.writer.write({'number': number,
+                                   'padding': 'x' * (number % 97)})
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        reads = 0
+        try:
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                data = self.reader.read()
+                if data is None:
+                    continue
+                reads += 1
+                self.assertEqual(len(data['padding']), data['number'] % 97)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertGreater(reads, 0)
+
+
+class PlaylistSummaryTest(unittest.TestCase):
+
+    ITEMS = [{'id': '4', 'name': 'a', 'duration': 60},
+             {'id': '5', 'name': 'b', 'duration': -1},
+             {'id': '6', 'name': 'c', 'duration': 30}]
+
+    def test_summary(self):
+        server = SlowHTTPServer(json.dumps(
+            _playlist_document(self.ITEMS)).encode())
+        self.addCleanup(server.close)
+        player = _player(self, http_host='127.0.0.1',
+                         http_port=server.server_address[1])
+        self.assertEqual(player._http_playlist_summary(current=5), {
+            'length': 3, 'duration': 90, 'current': self.ITEMS[1]})
+
+    def test_shared_summary(self):
+        shared = vlc.SharedStatus('test-%s' % uuid.uuid4().hex, size=4096)
+        self.addCleanup(os.unlink, shared.path)
+        self.addCleanup(shared.close)
+        summary = {'length': 1, 'duration': 60, 'current': None}
+        shared.write({'status': {}, 'playlist': summary})
+        # another process is polling already
+        player = _player(self, shared_status=shared)
+        player.SHARED_STATUS.elect = lambda: False
+        self.assertEqual(player.get_playlist_summary(), summary)
+
+    def test_rc_is_rejected(self):
+        player = _player(self, interfaces=['rc'])
+        with self.assertRaises(ValueError):
+            player.get_playlist_summary()
+
+
+class FakeStatusPlayer:
+    """Returns the given statuses one after another."""
+
+    def __init__(self, statuses) -> None:
+        self.statuses = iter(statuses)
+
+    def _http_fetch_status(self) -> dict:
+        return next(self.statuses)
+
+
+def _status(currentplid=4, position=0.5, state='playing', volume=256,
+            rate=1.0) -> dict:
+    return {'currentplid': currentplid, 'position': position,
+            'state': state, 'volume': volume, 'rate': rate}
+
+
+class TelemetryRecorderTest(unittest.TestCase):
+
+    def record(self, statuses, capacity=100) -> vlc.TelemetryRecorder:
+        recorder = vlc.TelemetryRecorder(FakeStatusPlayer(statuses),
+                                         capacity=capacity)
+        for _ in statuses:
+            recorder.sample()
+        return recorder
+
+    def test_ring_wraps_around(self):
+        recorder = self.record([_status(currentplid=id)
+                                for id in range(6)], capacity=4)
+        self.assertEqual(len(recorder), 4)
+        samples = recorder.window()
+        self.assertEqual(list(samples['currentplid']), [2, 3, 4, 5])
+        self.assertEqual(list(samples['time']), sorted(samples['time']))
+
+    def test_window(self):
+        with mock.patch.object(vlc.time, 'time',
+                               side_effect=[100.0, 101.0, 102.0, 103.0]):
+            recorder = self.record([_status(currentplid=id)
+                                    for id in range(4)])
+        self.assertEqual(
+            list(recorder.window(start=102.0)['currentplid']), [2, 3])
+        self.assertEqual(
+            list(recorder.window(end=101.0)['currentplid']), [0, 1])
+
+    def test_aggregate(self):
+        recorder = self.record([
+            _status(position=0.1),
+            _status(position=0.1),
+            _status(position=0.2, volume=300),
+            _status(position=0.2, state='paused'),
+            _status(currentplid=5, position=0.0, rate=2.0),
+        ])
+        summary = recorder.aggregate()
+        self.assertEqual(summary['samples'], 5)
+        self.assertEqual(summary['stalls'], 1)
+        self.assertEqual(summary['skips'], 1)
+        self.assertEqual(summary['volume_changes'], 2)
+        self.assertEqual(summary['playing'], 0.8)
+        self.assertAlmostEqual(summary['mean_rate'], 1.2)
+
+    def test_aggregate_empty(self):
+        summary = self.record([]).aggregate()
+        self.assertEqual(summary['samples'], 0)
+        self.assertIsNone(summary['playing'])
+
+    def test_to_csv(self):
+        recorder = self.record([_status(), _status()])
+        file = io.StringIO()
+        recorder.to_csv(file)
+        lines = file.getvalue().splitlines()
+        self.assertEqual(lines[0], ','.join(
+            name for name, typecode in recorder.FIELDS))
+        self.assertEqual(len(lines), 3)
+
+
+class FakeCuePlayer:
+    """Records the calls, 'block' holds seek calls until it is set."""
+
+    INTERFACE = vlc.VLC.HTTP
+
+    def __init__(self) -> None:
+        self.calls = list()
+        self.entered = threading.Event()
+        self.block = threading.Event()
+        self.block.set()
+
+    def status(self) -> dict:
+        time.sleep(0.001)
+        return _status()
+
+    def seek(self, seconds) -> str:
+        self.entered.set()
+        self.block.wait()
+        self.calls.append(('seek', seconds))
+        return 'seeked %s' % seconds
+
+    def fail(self):
+        raise ValueError("failed")
+
+
+class CueSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = list()
+        self.scheduler = vlc.CueScheduler(callback=self.sent.append)
+        self.addCleanup(self.scheduler.close)
+        self.player = FakeCuePlayer()
+
+    def test_cue_is_sent(self):
+        cue = self.scheduler.schedule(time.time() + 0.02, self.player,
+                                      'seek', 30)
+        self.assertTrue(cue.wait(5))
+        self.assertEqual(cue.result, 'seeked 30')
+        self.assertIsNone(cue.error)
+        self.assertIsNotNone(cue.estimated_skew)
+        self.assertGreaterEqual(cue.sent, cue.target - 0.01)
+        self.assertEqual(self.sent, [cue])
+        self.assertIn(self.player, self.scheduler.rtts)
+
+    def test_cues_run_in_order(self):
+        now = time.time()
+        cues = [self.scheduler.schedule(now + delay, self.player, 'seek',
+                                        delay)
+                for delay in (0.06, 0.02, 0.04)]
+        for cue in cues:
+            self.assertTrue(cue.wait(5))
+        self.assertEqual(self.player.calls,
+                         [('seek', 0.02), ('seek', 0.04), ('seek', 0.06)])
+
+    def test_error(self):
+        cue = self.scheduler.schedule(time.time(), self.player, 'fail')
+        self.assertTrue(cue.wait(5))
+        self.assertIsInstance(cue.error, ValueError)
+        self.assertEqual(self.scheduler.rtt(self.player), 0.0)
+
+    def test_rc_is_rejected(self):
+        self.player.INTERFACE = vlc.VLC.RC
+        with self.assertRaises(ValueError):
+            self.scheduler.schedule(time.time(), self.player, 'seek', 0)
+
+    def test_close_cancels_queued_cues(self):
+        self.player.block.clear()
+        running = self.scheduler.schedule(time.time(), self.player,
+                                          'seek', 1)
+        queued = self.scheduler.schedule(time.time() + 60, self.player,
+                                         'seek', 2)
+        self.assertTrue(self.player.entered.wait(5))
+        threading.Timer(0.05, self.player.block.set).start()
+        self.scheduler.close()
+        self.assertTrue(running.wait(0))
+        self.assertIsNone(running.error)
+        self.assertTrue(queued.wait(0))
+        self.assertIsInstance(queued.error, vlc.VLCCancelled)
+        self.assertEqual(self.sent, [running])
+        with self.assertRaises(ValueError):
+            self.scheduler.schedule(time.time(), self.player, 'seek', 3)
+
+    def test_calibrate(self):
+        self.assertGreater(self.scheduler.calibrate(self.player), 0)
+        self.assertEqual(len(self.scheduler.rtts), 1)
+
+
+RC_STATS = """\
++----[ begin of statistical info ]
++-[Incoming]
+| input bytes read :      360 KiB
+| input bitrate    :      128 kb/s
+| demux bytes read :      340 KiB
+| demux bitrate    :      120 kb/s
+| demux corrupted  :        1
+| discontinuities  :        2
+|
++-[Video Decoding]
+| video decoded    :      250
+| frames displayed :      240
+| frames lost      :        3
+|
++-[Audio Decoding]
+| audio decoded    :      500
+| buffers played   :      498
+| buffers lost     :        2
+|
++----[ end of statistical info ]"""
+
+RC_INFO = """\
++----[ Meta data ]
+| title: Grüße: a song
+| artist: someone
++----[ Stream 0 ]
+| Type: Audio
+| Codec: MPEG Audio layer 1/2 (mpga)
++----[ end of stream info ]"""
+
+
+def _stream_stats(time=0.0, **counters) -> vlc.StreamStats:
+    values = dict.fromkeys(vlc.StreamStats._fields, 0)
+    values.update(counters, time=time)
+    return vlc.StreamStats(**values)
+
+
+class StreamStatsTest(unittest.TestCase):
+
+    def test_rc_stats(self):
+        player = _player(self, FakeRC({'stats': RC_STATS}),
+                         dual_interface=True, timeout=2)
+        stats = player._rc_stats()
+        self.assertEqual(stats.input_bytes, 360 * 1024)
+        self.assertEqual(stats.input_bitrate, 128.0)
+        self.assertEqual(stats.demux_bytes, 340 * 1024)
+        self.assertEqual(stats.demux_bitrate, 120.0)
+        self.assertEqual(stats.demux_corrupted, 1)
+        self.assertEqual(stats.discontinuities, 2)
+        self.assertEqual(stats.video_decoded, 250)
+        self.assertEqual(stats.frames_displayed, 240)
+        self.assertEqual(stats.frames_lost, 3)
+        self.assertEqual(stats.audio_decoded, 500)
+        self.assertEqual(stats.buffers_played, 498)
+        self.assertEqual(stats.buffers_lost, 2)
+
+    def test_rc_stats_nothing_playing(self):
+        player = _player(self, FakeRC({'stats': ''}),
+                         dual_interface=True, timeout=2)
+        self.assertIsNone(player._rc_stats())
+
+    def test_rates(self):
+        previous = _stream_stats(time=10.0, input_bytes=1000,
+                                 frames_lost=4, input_bitrate=128.0)
+        current = _stream_stats(time=12.0, input_bytes=5000,
+                                frames_lost=10, input_bitrate=256.0)
+        rates = current.rates(previous)
+        self.assertEqual(rates['input_bytes'], 2000.0)
+        self.assertEqual(rates['frames_lost'], 3.0)
+        self.assertEqual(rates['buffers_lost'], 0.0)
+        self.assertNotIn('time', rates)
+        self.assertNotIn('input_bitrate', rates)
+
+    def test_rates_after_reset(self):
+        previous = _stream_stats(time=10.0, input_bytes=9000)
+        current = _stream_stats(time=14.0, input_bytes=400)
+        self.assertEqual(current.rates(previous)['input_bytes'], 100.0)
+
+    def test_rates_without_elapsed_time(self):
+        stats = _stream_stats(time=10.0, input_bytes=400)
+        self.assertIsNone(stats.rates(stats)['input_bytes'])
+
+    def test_rc_stream_info(self):
+        player = _player(self, FakeRC({'info': RC_INFO}),
+                         dual_interface=True, timeout=2)
+        self.assertEqual(player._rc_stream_info(), {
+            'meta': {'title': 'Grüße: a song', 'artist': 'someone'},
+            'Stream 0': {'Type': 'Audio',
+                         'Codec': 'MPEG Audio layer 1/2 (mpga)'},
+        })
+
+
+class PlaylistFileTest(unittest.TestCase):
+
+    MRLS = [
+        vlc.MRL(vlc.MRL.FILE, '/music/a b.mp3', options=[':start-time=5']),
+        vlc.MRL(vlc.MRL.DVD, '/dev/sr0', title=1, chapter=2, endtitle=3,
+                endchapter=4),
+        'http://host/x y.mp3?a=1&b=%20',
+        'relative & <odd>.mp3',
+    ]
+
+    def test_mrl_location(self):
+        self.assertEqual(self.MRLS[0].location(), 'file:///music/a b.mp3')
+        self.assertEqual(self.MRLS[1].location(), 'dvd:///dev/sr0#1:2-3:4')
+        mrl = vlc.MRL(vlc.MRL.HTTP, 'host/live', demux='ts', endchapter=7)
+        self.assertEqual(mrl.location(), 'http/ts://host/live#-:7')
+
+    def test_mrl_str(self):
+        mrl = vlc.MRL(vlc.MRL.FILE, '/a.mp3',
+                      options=['start-time=5', ':no-audio'])
+        self.assertEqual(str(mrl), 'file:///a.mp3 :start-time=5 :no-audio')
+        self.assertEqual(str(self.MRLS[1]), 'dvd:///dev/sr0#1:2-3:4')
+
+    def test_location_uri(self):
+        self.assertEqual(vlc._location_uri('file:///music/a b.mp3'),
+                         'file:///music/a%20b.mp3')
+        self.assertEqual(vlc._location_uri('http://host/x y?a=1&b=%20'),
+                         'http://host/x%20y?a=1&b=%20')
+        self.assertEqual(vlc._location_uri('/music/Grüße #1.mp3'),
+                         'file:///music/Gr%C3%BC%C3%9Fe%20%231.mp3')
+        self.assertEqual(vlc._location_uri('a.mp3'),
+                         pathlib.Path(os.path.abspath('a.mp3')).as_uri())
+
+    def test_m3u(self):
+        file = io.StringIO()
+        vlc.write_m3u(iter(self.MRLS), file)
+        self.assertEqual(file.getvalue().splitlines(), [
+            '#EXTM3U',
+            '#EXTVLCOPT:start-time=5',
+            'file:///music/a b.mp3',
+            'dvd:///dev/sr0#1:2-3:4',
+            'http://host/x y.mp3?a=1&b=%20',
+            'relative & <odd>.mp3',
+        ])
+
+    def test_xspf(self):
+        file = io.StringIO()
+        vlc.write_xspf(iter(self.MRLS), file)
+        root = ElementTree.fromstring(file.getvalue())
+        namespaces = {'x': 'http://xspf.org/ns/0/',
+                      'vlc': 'http://www.videolan.org/vlc/playlist/ns/0/'}
+        tracks = root.findall('x:trackList/x:track', namespaces)
+        self.assertEqual(
+            [track.findtext('x:location', namespaces=namespaces)
+             for track in tracks],
+            ['file:///music/a%20b.mp3',
+             'dvd:///dev/sr0#1:2-3:4',
+             'http://host/x%20y.mp3?a=1&b=%20',
+             vlc._location_uri('relative & <odd>.mp3')])
+        self.assertEqual(
+            [option.text for option in
+             tracks[0].findall('x:extension/vlc:option', namespaces)],
+            ['start-time=5'])
+        self.assertIsNone(tracks[1].find('x:extension', namespaces))
+
+    def test_enqueue_many(self):
+        player = _player(self)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'a list #1.xspf')
+            with mock.patch.object(player, 'enqueue') as enqueue:
+                self.assertEqual(
+                    player.enqueue_many(self.MRLS, format='xspf',
+                                        path=path), path)
+            with open(path, encoding='utf-8') as file:
+                self.assertIn('<trackList>', file.read())
+        enqueue.assert_called_once_with(pathlib.Path(path).as_uri())
+
+    def test_http_enqueue_quotes_input(self):
+        player = _player(self)
+        with mock.patch.object(player, '_http_get') as get, \
+                mock.patch.object(player, 'get_playlist'):
+            player._http_enqueue('file:///a%20list%20%231.m3u')
+        get.assert_called_once_with(
+            'requests/status.json?command=in_enqueue&input='
+            'file%3A%2F%2F%2Fa%2520list%2520%25231.m3u')
+
+
+if __name__ == '__main__':
+    unittest.main()
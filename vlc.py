@@ -34,11 +34,47 @@ if sys.version_info[0] != 3 or sys.version_info[1] < 6:
     print("VLC.PY: This script requires Python version 3.6")
     sys.exit(1)
 
+if __name__ == '__main__':
+    # 'python -m vlc' sends single commands to the daemon, so it shouldn't
+    # pay for importing requests and everything below
+    try:
+        from .vlc_client import main
+    except ImportError:
+        from vlc_client import main
+    sys.exit(main())
+
+import array
+import codecs
+import contextlib
+import csv
+import fcntl
+import functools
+import heapq
+import io
+import json
+import mmap
 import os
+import pathlib
+import re
 import socket
+import socketserver
 import requests
+import urllib3
+import struct
 import subprocess
-from typing import List, NewType
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from xml.sax.saxutils import escape
+from typing import Callable, IO, Iterable, List, NamedTuple, NewType
+
+# the repository can be used as a package or as a plain module
+try:
+    from .vlc_client import DAEMON_SOCKET, DaemonError
+except ImportError:
+    from vlc_client import DAEMON_SOCKET, DaemonError
 
 
 class MRL:
@@ -89,16 +125,8 @@ class MRL:
         self.endchapter = endchapter
         self.options = options
 
-    def __str__(self) -> str:
-        """
-        MRL to String.
-
-        Turn the gathered information into a MRL-String following the
-            VLC-MRL-Specification from:
-            https://wiki.videolan.org/Media_resource_locator/
-
-            # !!! mostly untested !!!
-        """
+    def location(self) -> str:
+        """MRL to String, without the options."""
         outstr = self.access
         if self.demux is not None:
             outstr += "/" + self.demux
@@ -109,27 +137,642 @@ class MRL:
            self.endchapter is not None:
             outstr += '#'
             if self.title is not None:
-                outstr += self.title
+                outstr += str(self.title)
             if self.chapter is not None:
-                outstr += ":" + self.chapter
+                outstr += ":" + str(self.chapter)
             if self.endtitle is not None or \
                self.endchapter is not None:
                 outstr += '-'
             if self.endtitle is not None:
-                outstr += self.endtitle
+                outstr += str(self.endtitle)
             if self.endchapter is not None:
-                outstr += ':' + self.endchapter
+                outstr += ':' + str(self.endchapter)
+        return outstr
+
+    def __str__(self) -> str:
+        """
+        MRL to String.
+
+        Turn the gathered information into a MRL-String following the
+            VLC-MRL-Specification from:
+            https://wiki.videolan.org/Media_resource_locator/
+
+            # !!! mostly untested !!!
+        """
+        outstr = self.location()
         if self.options is not None:
-            for option in self.options.items():
-                outstr += ' :' + option
+            for option in self.options:
+                outstr += ' :' + option.lstrip(':')
         return outstr
 
 
+def _playlist_entry(mrl):
+    """Split <mrl>, an MRL or a string, into location and options."""
+    if isinstance(mrl, MRL):
+        return mrl.location(), [option.lstrip(':')
+                                for option in mrl.options or ()]
+    return str(mrl), []
+
+
+def _location_uri(location: str) -> str:
+    """
+    Turn the <location> of an MRL into a percent-encoded URI.
+
+    Plain paths become file:// URIs, other locations keep their scheme and
+        get characters like spaces encoded. Existing escapes are kept.
+    """
+    if '://' not in location:
+        return pathlib.Path(os.path.abspath(location)).as_uri()
+    scheme, rest = location.split('://', 1)
+    return scheme + '://' + urllib.parse.quote(
+        rest, safe="/:?&=#%@+,;~!$'()*[]")
+
+
+def write_m3u(mrls: Iterable, file: IO):
+    """Stream <mrls> into the open text <file> as M3U playlist."""
+    file.write('#EXTM3U\n')
+    for mrl in mrls:
+        location, options = _playlist_entry(mrl)
+        for option in options:
+            file.write('#EXTVLCOPT:%s\n' % option)
+        file.write(location + '\n')
+
+
+def write_xspf(mrls: Iterable, file: IO):
+    """
+    Stream <mrls> into the open text <file> as XSPF playlist.
+
+    XSPF locations have to be URIs, so paths and special characters are
+        percent-encoded, see _location_uri.
+    """
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<playlist xmlns="http://xspf.org/ns/0/" '
+               'xmlns:vlc="http://www.videolan.org/vlc/playlist/ns/0/" '
+               'version="1">\n<trackList>\n')
+    for mrl in mrls:
+        location, options = _playlist_entry(mrl)
+        file.write('<track><location>%s</location>'
+                   % escape(_location_uri(location)))
+        if options:
+            file.write('<extension application='
+                       '"http://www.videolan.org/vlc/playlist/0">')
+            for option in options:
+                file.write('<vlc:option>%s</vlc:option>' % escape(option))
+            file.write('</extension>')
+        file.write('</track>\n')
+    file.write('</trackList>\n</playlist>\n')
+
+
+class CommandCoalescer:
+    """
+    Collapse bursts of idempotent commands into a single call.
+
+    Commands submitted under the same key are held back for up to <window>
+        seconds after the first one of a burst arrived. Absolute values
+        follow latest-wins, relative steps are summed up. When the window
+        is over, <send>(value, delta) of the latest submission is called
+        once from a background thread.
+    Every submission returns a Future, which resolves to the result of the
+        one call that was actually sent for its burst.
+    """
+
+    def __init__(self, window: float=0.1) -> None:
+        """Create a coalescer flushing bursts after <window> seconds."""
+        self.window = window
+        self._pending = dict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self,
+               key: str,
+               send: Callable,
+               value=None,
+               delta=0) -> Future:
+        """
+        Add a command to the burst of <key>.
+
+        If <value> is not None it replaces the value of the burst and
+            drops all relative steps submitted before. <delta> is added to
+            the relative steps of the burst.
+        """
+        future = Future()
+        with self._cond:
+            burst = self._pending.get(key)
+            if burst is None:
+                burst = {
+                    'deadline': time.monotonic() + self.window,
+                    'value': None,
+                    'delta': 0,
+                    'futures': list(),
+                }
+                self._pending[key] = burst
+            if value is not None:
+                burst['value'] = value
+                burst['delta'] = 0
+            burst['delta'] += delta
+            burst['send'] = send
+            burst['futures'].append(future)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def flush(self):
+        """Send all pending bursts now, from the calling thread."""
+        with self._cond:
+            due = list(self._pending.values())
+            self._pending.clear()
+        for burst in due:
+            self._fire(burst)
+
+    def _fire(self, burst):
+        try:
+            result = burst['send'](burst['value'], burst['delta'])
+        except Exception as e:
+            for future in burst['futures']:
+                future.set_exception(e)
+        else:
+            for future in burst['futures']:
+                future.set_result(result)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, burst in self._pending.items()
+                           if burst['deadline'] <= now]
+                    if due:
+                        due = [self._pending.pop(key) for key in due]
+                        break
+                    if self._pending:
+                        self._cond.wait(
+                            min(burst['deadline']
+                                for burst in self._pending.values()) - now)
+                    else:
+                        self._cond.wait()
+            for burst in due:
+                self._fire(burst)
+
+
+class TraceRecorder:
+    """
+    Record every command sent to VLC into a compact CSV trace.
+
+    Each row holds the wall clock timestamp, the interface ('http' or
+        'rc'), the command, the size of the response in bytes and the
+        latency in seconds. Traces can be replayed with replay_trace.
+    """
+
+    FIELDS = ['timestamp', 'interface', 'command', 'size', 'latency']
+
+    def __init__(self, file) -> None:
+        """Record into <file>, either a path or an open text file."""
+        if isinstance(file, str):
+            self._file = open(file, 'w', newline='')
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.FIELDS)
+        self._lock = threading.Lock()
+
+    def record(self,
+               timestamp: float,
+               interface: str,
+               command: str,
+               size: int,
+               latency: float):
+        """Write a single command to the trace."""
+        with self._lock:
+            self._writer.writerow([
+                '%.6f' % timestamp, interface, command, size,
+                '%.6f' % latency
+            ])
+
+    def close(self):
+        """Flush the trace and close the file, if it was opened here."""
+        with self._lock:
+            if self._owns_file:
+                self._file.close()
+            else:
+                self._file.flush()
+
+
+def read_trace(file: IO) -> List[dict]:
+    """Read a trace written by TraceRecorder from an open text file."""
+    return [{
+        'timestamp': float(row['timestamp']),
+        'interface': row['interface'],
+        'command': row['command'],
+        'size': int(row['size']),
+        'latency': float(row['latency']),
+    } for row in csv.DictReader(file)]
+
+
+# a complete string, a structural character or the start of a string,
+#  which doesn't end in the data read so far
+_JSON_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\],"]')
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _iter_json_items(chunks, path: tuple):
+    """
+    Incrementally decode the objects found at <path> of a JSON document.
+
+    <chunks> is an iterable of bytes. <path> lists the keys leading to the
+        objects, starting with None for the document itself and using ints
+        for array indices, e.g. (None, 'children', 0, 'children').
+    Only the matching objects are decoded and yielded one by one, all other
+        parts of the document are skipped without building them.
+    """
+    # every frame is [kind, key in parent, last string, array index]
+    stack = list()
+    text = ''
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text += decoder.decode(chunk)
+        pos = 0
+        while True:
+            match = _JSON_TOKEN.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            token = match.group()
+            if token == '"':
+                # wait for the rest of the string
+                pos = match.start()
+                break
+            if token[0] == '"':
+                if len(stack) <= len(path) and stack[-1][0] == '{':
+                    # keys on the way to <path> don't contain escapes
+                    stack[-1][2] = token[1:-1]
+            elif token == ',':
+                if stack[-1][0] == '[':
+                    stack[-1][3] += 1
+            elif token in '{[':
+                if not stack:
+                    key = None
+                elif stack[-1][0] == '{':
+                    key = stack[-1][2]
+                else:
+                    key = stack[-1][3]
+                if (token == '{' and len(stack) == len(path) and
+                        tuple(frame[1] for frame in stack) == path):
+                    try:
+                        item, pos = _JSON_DECODER.raw_decode(text,
+                                                             match.start())
+                    except ValueError:
+                        # the item isn't complete yet
+                        pos = match.start()
+                        break
+                    yield item
+                    continue
+                stack.append([token, key, None, 0])
+            else:
+                stack.pop()
+            pos = match.end()
+        text = text[pos:]
+    text += decoder.decode(b'', final=True)
+    if stack or text.strip():
+        raise ValueError("Incomplete JSON document.")
+
+
+class InterfaceRouter:
+    """
+    Choose the cheaper interface for each command.
+
+    The latency of every command is measured per interface and smoothed
+        with an exponential moving average. Interfaces without a
+        measurement are tried first, afterwards the fastest one is used and
+        every <probe_every> calls the runner-up is tried again.
+    Interfaces that failed are put behind the others for <cooldown>
+        seconds, interfaces that can't run a command are never used for it.
+    """
+
+    def __init__(self,
+                 interfaces: List[str],
+                 alpha: float=0.2,
+                 probe_every: int=50,
+                 cooldown: float=5.0) -> None:
+        """Route between <interfaces>, given in order of preference."""
+        self.interfaces = interfaces
+        self.alpha = alpha
+        self.probe_every = probe_every
+        self.cooldown = cooldown
+        self.latency = dict()
+        self._calls = dict()
+        self._unable = set()
+        self._down = dict()
+        self._lock = threading.Lock()
+
+    def candidates(self, command: str) -> List[str]:
+        """Return the interfaces to try for <command>, best first."""
+        with self._lock:
+            now = time.monotonic()
+            calls = self._calls.get(command, 0) + 1
+            self._calls[command] = calls
+            usable = [interface for interface in self.interfaces
+                      if (command, interface) not in self._unable]
+            up = [interface for interface in usable
+                  if self._down.get(interface, 0) <= now]
+            down = [interface for interface in usable if interface not in up]
+            up.sort(key=lambda interface:
+                    self.latency.get((command, interface), -1.0))
+            if len(up) > 1 and calls % self.probe_every == 0:
+                up.insert(0, up.pop(1))
+            return up + down
+
+    def measured(self, command: str, interface: str, latency: float):
+        """Add a <latency> measurement of <command> on <interface>."""
+        with self._lock:
+            key = (command, interface)
+            if key in self.latency:
+                latency = (self.alpha * latency +
+                           (1 - self.alpha) * self.latency[key])
+            self.latency[key] = latency
+            self._down.pop(interface, None)
+
+    def failed(self, interface: str):
+        """Put <interface> behind the others for a while."""
+        with self._lock:
+            self._down[interface] = time.monotonic() + self.cooldown
+
+    def unable(self, command: str, interface: str):
+        """Never use <interface> for <command> again."""
+        with self._lock:
+            self._unable.add((command, interface))
+
+
+class SharedStatus:
+    """
+    Status of one VLC, shared by all processes on a host.
+
+    The status and a summary of the playlist are kept in a memory mapped
+        file, named after <name>. One process is elected as poller by
+        holding a lock on the file; it refreshes the data every <interval>
+        seconds. If the poller dies, the next reader takes over.
+    Writes are guarded like a seqlock: the sequence number is odd while
+        the data is being written and readers retry until they read the
+        same even sequence number before and after the data.
+    Data older than <max_age> seconds is treated as missing.
+    """
+
+    # sequence number, then update time, poller pid and payload length
+    SEQUENCE = struct.Struct('<Q')
+    HEADER = struct.Struct('<dqI')
+
+    def __init__(self,
+                 name: str,
+                 interval: float=0.25,
+                 max_age: float=1.0,
+                 size: int=262144) -> None:
+        """Open or create the shared segment <name> of <size> bytes."""
+        directory = '/dev/shm'
+        if not os.path.isdir(directory):
+            directory = tempfile.gettempdir()
+        self.path = os.path.join(directory, 'python3-vlc-%s' % name)
+        self.interval = interval
+        self.max_age = max_age
+        self.poller = False
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = max(size, os.fstat(self._fd).st_size)
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._offset = self.SEQUENCE.size + self.HEADER.size
+
+    def elect(self) -> bool:
+        """Try to become the poller, True if this object is the poller."""
+        if not self.poller:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.poller = True
+            except OSError:
+                pass
+        return self.poller
+
+    def write(self, data: dict):
+        """Publish <data>, only the poller may call this."""
+        payload = json.dumps(data).encode('utf-8')
+        if len(payload) > len(self._map) - self._offset:
+            raise ValueError("Shared status too large.", len(payload))
+        sequence = self.SEQUENCE.unpack_from(self._map)[0] + 1
+        self.SEQUENCE.pack_into(self._map, 0, sequence)
+        self._map[self._offset:self._offset + len(payload)] = payload
+        self.HEADER.pack_into(self._map, self.SEQUENCE.size, time.time(),
+                              os.getpid(), len(payload))
+        self.SEQUENCE.pack_into(self._map, 0, sequence + 1)
+
+    def read(self, retries: int=100) -> dict:
+        """Get the published data, None if there is no fresh data."""
+        for _ in range(retries):
+            sequence = self.SEQUENCE.unpack_from(self._map)[0]
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            updated, pid, length = self.HEADER.unpack_from(
+                self._map, self.SEQUENCE.size)
+            payload = self._map[self._offset:self._offset + length]
+            if self.SEQUENCE.unpack_from(self._map)[0] != sequence:
+                continue
+            if sequence == 0 or time.time() - updated > self.max_age:
+                return None
+            return json.loads(payload.decode('utf-8'))
+        return None
+
+    def close(self):
+        """Unmap the segment and give up polling."""
+        self._map.close()
+        os.close(self._fd)
+        self.poller = False
+
+
+class StreamStats(NamedTuple):
+    """
+    Statistics of the current input, see VLC.get_stats.
+
+    Bytes and frame or buffer counts add up while an item plays, bitrates
+        are in kb/s. VLC doesn't count buffer underruns, lost audio buffers
+        are the closest measure.
+    """
+
+    time: float
+    input_bytes: int
+    input_bitrate: float
+    demux_bytes: int
+    demux_bitrate: float
+    demux_corrupted: int
+    discontinuities: int
+    video_decoded: int
+    frames_displayed: int
+    frames_lost: int
+    audio_decoded: int
+    buffers_played: int
+    buffers_lost: int
+
+    def rates(self, previous: 'StreamStats') -> dict:
+        """
+        Get the change per second of every counter since <previous>.
+
+        If a counter was reset, e.g. by switching to the next item, its
+            current value is taken as change.
+        """
+        elapsed = self.time - previous.time
+        rates = dict()
+        for field in self._fields:
+            if field == 'time' or field.endswith('bitrate'):
+                continue
+            change = getattr(self, field) - getattr(previous, field)
+            if change < 0:
+                change = getattr(self, field)
+            rates[field] = change / elapsed if elapsed > 0 else None
+        return rates
+
+
+# prompts of the rc interface after every answer; commands without output
+#  are answered with a bare prompt, right after the one before
+_RC_PROMPTS = re.compile(rb'\n(?:> )+')
+
+
+class VLCTimeout(TimeoutError):
+    """VLC didn't answer before the deadline of a call expired."""
+
+
+class VLCCancelled(VLCTimeout):
+    """A call was aborted by VLC.cancel()."""
+
+
+def _with_timeout(method):
+    """Let a VLC <method> take an optional <timeout> in seconds."""
+    @functools.wraps(method)
+    def wrapper(self, *args, timeout: float=None, **kwargs):
+        if timeout is None:
+            return method(self, *args, **kwargs)
+        with self.deadline(timeout):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# the http call running in the current thread, see _AbortableConnection
+_http_local = threading.local()
+
+
+class _HTTPCall:
+    """Deadline and sockets of one http call, so it can be aborted."""
+
+    def __init__(self, deadline, generation) -> None:
+        self.deadline = deadline
+        self.generation = generation
+        self.sockets = set()
+        self.aborted = False
+
+    def add(self, sock: socket.socket):
+        """Track <sock>, which was opened or reused for this call."""
+        self.sockets.add(sock)
+        if self.aborted:
+            self.abort()
+
+    def abort(self):
+        """Shut the sockets down, which wakes up blocked reads right away."""
+        self.aborted = True
+        for sock in list(self.sockets):
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
+
+class _AbortableConnection(urllib3.connection.HTTPConnection):
+    """Connection handing its socket to the http call of its thread."""
+
+    def _track(self):
+        call = getattr(_http_local, 'call', None)
+        if call is not None and self.sock is not None:
+            call.add(self.sock)
+
+    def connect(self):
+        super().connect()
+        self._track()
+
+    def request(self, *args, **kwargs):
+        # reused keep-alive connections don't connect again
+        self._track()
+        return super().request(*args, **kwargs)
+
+
+class _AbortablePool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _AbortableConnection
+
+
+class _AbortableAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter using _AbortableConnection for plain http."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(
+            self.poolmanager.pool_classes_by_scheme, http=_AbortablePool)
+
+
 class VLC:
     """VLC remote controll class."""
 
     HTTP = 'http'
     RC = 'rc'
+    DUAL = 'dual'
+
+    # commands giving the same result on both interfaces, named like their
+    #  http implementation; all other commands use http in dual mode.
+    #  set_volume, volup and voldown are missing on purpose: rc answers
+    #  them differently and moves the volume in steps instead of units
+    ROUTABLE = {
+        'add', 'enqueue', 'delete', 'sort', 'play', 'stop', 'next',
+        'previous', 'repeat', 'loop', 'random', 'empty', 'seek', 'pause',
+        'get_time', 'is_playing', 'get_volume', 'stats', 'stream_info'
+    }
+    # routable commands, which don't change anything in VLC and can safely
+    #  be run again on the other interface if the first one failed
+    READ_ONLY = {
+        'get_time', 'is_playing', 'get_volume', 'stats', 'stream_info'
+    }
+
+    VOLUME_MAX = 512
+    # how often blocking rc reads check for cancel()
+    POLL_INTERVAL = 0.05
+    # how many status polls the shared playlist summary is kept for
+    SUMMARY_POLLS = 20
+    # StreamStats fields by labels of rc 'stats' and keys of status.json
+    RC_STATS = {
+        'input bytes read': 'input_bytes',
+        'input bitrate': 'input_bitrate',
+        'demux bytes read': 'demux_bytes',
+        'demux bitrate': 'demux_bitrate',
+        'demux corrupted': 'demux_corrupted',
+        'discontinuities': 'discontinuities',
+        'video decoded': 'video_decoded',
+        'frames displayed': 'frames_displayed',
+        'frames lost': 'frames_lost',
+        'audio decoded': 'audio_decoded',
+        'buffers played': 'buffers_played',
+        'buffers lost': 'buffers_lost',
+    }
+    HTTP_STATS = {
+        'readbytes': 'input_bytes',
+        'inputbitrate': 'input_bitrate',
+        'demuxreadbytes': 'demux_bytes',
+        'demuxbitrate': 'demux_bitrate',
+        'demuxcorrupted': 'demux_corrupted',
+        'demuxdiscontinuity': 'discontinuities',
+        'decodedvideo': 'video_decoded',
+        'displayedpictures': 'frames_displayed',
+        'lostpictures': 'frames_lost',
+        'decodedaudio': 'audio_decoded',
+        'playedabuffers': 'buffers_played',
+        'lostabuffers': 'buffers_lost',
+    }
+    # leaf items of the playlist node in requests/playlist.json
+    PLAYLIST_ITEMS_PATH = (None, 'children', 0, 'children')
+    # playlist file formats for enqueue_many
+    PLAYLIST_WRITERS = {'m3u': write_m3u, 'xspf': write_xspf}
 
     def __init__(self,
                  screen_name='vlc_screen',
@@ -140,7 +783,13 @@ class VLC:
                  rc_host='localhost',
                  rc_port=8888,
                  aout=None,
-                 vout=None):
+                 vout=None,
+                 coalesce_window=None,
+                 on_playlist_repair=None,
+                 recorder: TraceRecorder=None,
+                 dual_interface=False,
+                 timeout: float=10.0,
+                 shared_status: SharedStatus=None):
         """
         Create a connection to VLC-Player.
 
@@ -153,16 +802,64 @@ class VLC:
         Currently using 'http' is highly recommended.
         If <screen_name> is None, VLC will not start a new player but try to
             connect to the given http or rc port given in the other parameters.
+        If <coalesce_window> is given, bursts of seek and volume commands
+            within that many seconds are collapsed into one command. Those
+            methods then return a Future instead of their result.
+        Corrupted RC playlist entries are removed automatically. A report of
+            every repair is kept in <playlist_repair> and passed to the
+            <on_playlist_repair> callback, if given.
+        If a <recorder> is given, every command sent to VLC is written to
+            its trace.
+        If <dual_interface> is True, both the http and the rc interface are
+            used. Each command is routed to the one that answered it faster
+            before and falls back to the other one if it fails.
+        Every call to VLC waits at most <timeout> seconds (None waits
+            forever) before raising VLCTimeout. All public methods also take
+            a <timeout> keyword, see deadline() and cancel().
+        If <shared_status> is given, the http status is read from there
+            instead of asking VLC, so getters might return data up to its
+            max_age old. If no other process polls VLC for it, this object
+            starts doing so.
         """
         # interface http or/and rc allowed
         # http prefered
         self.SCREEN_NAME = screen_name
         self.HTTP_PASSWORD = http_password
+        self.RC_LOCK = threading.RLock()
+        self.TIMEOUT = timeout
+        self._local = threading.local()
+        self._generation = 0
+        # all http calls share one session, so connections are kept alive
+        self._session = requests.Session()
+        self._session.mount('http://', _AbortableAdapter())
+        self._http_calls = set()
+        self._http_watch = threading.Condition()
+        self._http_watchdog = None
+        self._rc_dirty = False
+        self._rc_syncs = 0
+        self.COALESCER = None
+        if coalesce_window is not None:
+            self.COALESCER = CommandCoalescer(coalesce_window)
+        self.PLAYLIST_REPAIR_CALLBACK = on_playlist_repair
+        self.RECORDER = recorder
+        self.SHARED_STATUS = shared_status
+        self._shared_poller = None
+        self.playlist_repair = None
+        self.ROUTER = None
         # convert string to list
         # interfaces = list(filter(
         #    lambda x:x!='', interfaces.lower().split(',')))
+        interfaces = list(interfaces)
 
-        if 'http' in interfaces:
+        if dual_interface:
+            # http is started as main interface, rc as extra interface
+            interfaces = [i for i in interfaces if i not in ('http', 'rc')]
+            interfaces.append('rc')
+            self.INTERFACE = self.DUAL
+            self.HOST = http_host
+            self.PORT = http_port
+            self.ROUTER = InterfaceRouter([self.RC, self.HTTP])
+        elif 'http' in interfaces:
             # http is default interface
             interfaces.remove('http')
             self.INTERFACE = self.HTTP
@@ -191,8 +888,10 @@ class VLC:
             if cmd.returncode:
                 startup_commands = [
                     'screen', '-dmS', self.SCREEN_NAME, 'vlc', '--intf',
-                    self.INTERFACE, '--http-host', http_host, '--http-port',
-                    str(http_port), '--http-password', http_password,
+                    self.HTTP if self.INTERFACE is self.DUAL
+                    else self.INTERFACE, '--http-host', http_host,
+                    '--http-port', str(http_port),
+                    '--http-password', http_password,
                     '--rc-host',
                     '%s:%i' % (rc_host, int(rc_port))
                 ]
@@ -216,14 +915,29 @@ class VLC:
                     self._vlc_log("starting vlc-player")
                     subprocess.run(startup_commands)
 
-        # AF_INET --> .connect((HOST, PORT))
+        if self.INTERFACE is self.DUAL:
+            self.SOCK = self._connect(rc_host, int(rc_port))
+            # skip the greeting before the first command
+            self._rc_dirty = True
+        else:
+            self.SOCK = self._connect(self.HOST, self.PORT)
+        # self.SOCK.settimeout(2)
+        # try:
+        #     for i in range(5):
+        #         self._vlc_log(self.SOCK.recv(1024).decode('utf-8'))
+        # except Exception:
+        #     pass
+        # self.SOCK.settimeout(1)
 
-        self.SOCK = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    def _connect(self, host, port) -> socket.socket:
+        """Connect to <host>:<port>, retrying while VLC is starting up."""
+        # AF_INET --> .connect((HOST, PORT))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         failcount = 0
         while True:
             try:
                 # retry connecting
-                self.SOCK.connect((self.HOST, self.PORT))
+                sock.connect((host, port))
             except ConnectionRefusedError as e:
                 failcount += 1
                 if failcount <= 1000:
@@ -231,40 +945,250 @@ class VLC:
                 else:
                     self._vlc_log("Please run vlc-player manually.")
                     raise e
-            break
-        # self.SOCK.settimeout(2)
-        # try:
-        #     for i in range(5):
-        #         self._vlc_log(self.SOCK.recv(1024).decode('utf-8'))
-        # except Exception:
-        #     pass
-        # self.SOCK.settimeout(1)
+            return sock
+
+    @contextlib.contextmanager
+    def deadline(self, timeout: float):
+        """
+        Limit all calls to VLC within the block to <timeout> seconds.
+
+        Deadlines only apply to the current thread. Nested deadlines can only
+            shorten the time left, never extend it.
+        """
+        outer = getattr(self._local, 'deadline', None)
+        deadline = time.monotonic() + timeout
+        if outer is not None:
+            deadline = min(outer, deadline)
+        self._local.deadline = deadline
+        try:
+            yield
+        finally:
+            self._local.deadline = outer
+
+    def cancel(self):
+        """
+        Abort all calls to VLC, which are in flight right now.
+
+        Waiting rc reads stop within POLL_INTERVAL, http requests are
+            aborted right away. Aborted calls raise VLCCancelled.
+        """
+        self._generation += 1
+        with self._http_watch:
+            for call in self._http_calls:
+                call.abort()
+
+    def _deadline(self):
+        """Get the deadline of a call starting now, None if there is none."""
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None and self.TIMEOUT is not None:
+            deadline = time.monotonic() + self.TIMEOUT
+        return deadline
+
+    def _remaining(self, deadline, generation) -> float:
+        """Get the seconds left until <deadline> or raise VLCTimeout."""
+        if generation != self._generation:
+            raise VLCCancelled("Call to VLC was cancelled.")
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise VLCTimeout("VLC didn't answer in time.")
+        return remaining
+
+    def _rc_sendall(self, data: bytes, deadline, generation):
+        self.SOCK.settimeout(self._remaining(deadline, generation))
+        try:
+            self.SOCK.sendall(data)
+        except socket.timeout as e:
+            raise VLCTimeout("VLC didn't accept the command in time.") from e
+
+    def _rc_recv(self, buffersize, deadline, generation) -> bytes:
+        """Receive up to <buffersize> bytes, polling for cancel()."""
+        while True:
+            remaining = self._remaining(deadline, generation)
+            if remaining is None or remaining > self.POLL_INTERVAL:
+                remaining = self.POLL_INTERVAL
+            self.SOCK.settimeout(remaining)
+            try:
+                return self.SOCK.recv(buffersize)
+            except socket.timeout:
+                continue
+
+    def _rc_recv_prompts(self, prompts: int, deadline, generation) -> bytes:
+        """Receive answers up to the <prompts>th prompt VLC sends."""
+        # a leading newline lets a prompt at the very start match as well
+        answer = b'\n'
+        found = 0
+        scanned = 0
+        while True:
+            answer += self._rc_recv(65536, deadline, generation)
+            pending = 0
+            for match in _RC_PROMPTS.finditer(answer, scanned):
+                if match.end() > len(answer) - 2:
+                    # the run might go on in the next chunk
+                    pending = (match.end() - match.start()) // 2
+                    break
+                found += (match.end() - match.start()) // 2
+                scanned = match.end()
+            if found + pending >= prompts:
+                return answer[1:]
+            if not pending:
+                scanned = max(scanned, len(answer) - 2)
+
+    def _rc_sync(self, deadline, generation):
+        """
+        Skip everything VLC sent so far.
+
+        An unknown marker command is sent and all answers are read up to the
+            prompt after the complaint about the marker, so the next read
+            gets the answer to the next command.
+        """
+        self._rc_dirty = True
+        self._rc_syncs += 1
+        marker = ('_sync_%i_' % self._rc_syncs).encode()
+        self._rc_sendall(marker + b'\n', deadline, generation)
+        buffer = b''
+        while True:
+            buffer += self._rc_recv(4096, deadline, generation)
+            index = buffer.find(marker)
+            if index < 0:
+                buffer = buffer[-len(marker):]
+            elif buffer.find(b'> ', index) >= 0:
+                break
+            else:
+                buffer = buffer[index:]
+        self._rc_dirty = False
+
+    def _rc_exchange(self, cmd: str, buffersize=None) -> bytes:
+        """
+        Send <cmd> and read <buffersize> bytes of the answer, if given.
+
+        If a call fails or is aborted halfway, the rc stream is synced again
+            before the next command.
+        """
+        generation = self._generation
+        deadline = self._deadline()
+        with self.RC_LOCK:
+            # nothing was sent yet, so the stream stays in sync
+            self._remaining(deadline, generation)
+            try:
+                if self._rc_dirty:
+                    self._rc_sync(deadline, generation)
+                self._rc_sendall(cmd.encode(), deadline, generation)
+                if self.INTERFACE is self.DUAL:
+                    # read the whole answer, so rc latencies compare to http
+                    #  and the next command starts on a clean stream
+                    return self._rc_recv_prompts(cmd.count('\n'), deadline,
+                                                 generation)
+                if buffersize is None:
+                    return b''
+                return self._rc_recv(buffersize, deadline, generation)
+            except Exception:
+                self._rc_dirty = True
+                raise
 
     def _rc_get(self, cmd, buffersize=0):
         """Prepare a command and send it to VLC."""
         if not cmd.endswith('\n'):
             cmd = cmd + '\n'
-        cmd = cmd.encode()
-        self.SOCK.sendall(cmd)
+        timestamp, start = time.time(), time.perf_counter()
         # allways read at least 2 bytes!
-        answer = self.SOCK.recv(buffersize + 2)
+        answer = self._rc_exchange(cmd, buffersize + 2)
+        if self.RECORDER is not None:
+            self.RECORDER.record(timestamp, self.RC, cmd.rstrip('\n'),
+                                 len(answer), time.perf_counter() - start)
         return answer.decode('utf-8').split('\r\n> ')[0]
 
     def _rc_send(self, cmd):
         """Prepare a command and send it to VLC."""
         if not cmd.endswith('\n'):
             cmd = cmd + '\n'
-        cmd = cmd.encode()
-        self.SOCK.sendall(cmd)
+        timestamp, start = time.time(), time.perf_counter()
+        self._rc_exchange(cmd)
+        if self.RECORDER is not None:
+            self.RECORDER.record(timestamp, self.RC, cmd.rstrip('\n'), 0,
+                                 time.perf_counter() - start)
 
-    def _http_get(self, cmd: str) -> requests.Response:
-        get_url = 'http://%s:%i/%s' % (self.HOST, self.PORT, cmd)
+    def _http_url(self, cmd: str) -> str:
+        return 'http://%s:%i/%s' % (self.HOST, self.PORT, cmd)
+
+    @contextlib.contextmanager
+    def _http_call(self, url: str):
+        """
+        Track an http call to <url>, so its deadline and cancel() abort it.
+
+        The timeout of requests only limits single socket operations, so a
+            watchdog thread shuts the sockets of the call down once its
+            deadline expired. Errors caused by aborting a call are raised as
+            VLCTimeout or VLCCancelled.
+        """
+        call = _HTTPCall(self._deadline(), self._generation)
+        self._remaining(call.deadline, call.generation)
+        with self._http_watch:
+            self._http_calls.add(call)
+            if call.deadline is not None:
+                if self._http_watchdog is None:
+                    self._http_watchdog = threading.Thread(
+                        target=self._http_watch_deadlines, daemon=True)
+                    self._http_watchdog.start()
+                self._http_watch.notify()
         try:
-            return requests.get(get_url, auth=('', self.HTTP_PASSWORD))
+            yield call
+        except VLCTimeout:
+            raise
         except Exception as e:
-            print("VLC HTTP interface not running at " + get_url)
-            raise e
-            return None
+            if call.generation != self._generation:
+                raise VLCCancelled("Call to VLC was cancelled.", url) from e
+            if call.aborted or isinstance(e, requests.exceptions.Timeout):
+                raise VLCTimeout("VLC didn't answer in time.", url) from e
+            if isinstance(e, requests.exceptions.ConnectionError):
+                print("VLC HTTP interface not running at " + url)
+            raise
+        finally:
+            with self._http_watch:
+                self._http_calls.discard(call)
+
+    def _http_watch_deadlines(self):
+        """Abort http calls when their deadline expired, runs in a thread."""
+        with self._http_watch:
+            while True:
+                now = time.monotonic()
+                waiting = list()
+                for call in self._http_calls:
+                    if call.aborted or call.deadline is None:
+                        continue
+                    if call.deadline <= now:
+                        call.abort()
+                    else:
+                        waiting.append(call.deadline)
+                self._http_watch.wait(min(waiting) - now if waiting else None)
+
+    def _http_send(self, call: _HTTPCall, cmd: str,
+                   stream=False) -> requests.Response:
+        """Send <cmd> as part of <call>, tracking the sockets it uses."""
+        url = self._http_url(cmd)
+        timestamp, start = time.time(), time.perf_counter()
+        outer = getattr(_http_local, 'call', None)
+        _http_local.call = call
+        try:
+            response = self._session.get(
+                url, auth=('', self.HTTP_PASSWORD), stream=stream,
+                timeout=self._remaining(call.deadline, call.generation))
+        finally:
+            _http_local.call = outer
+        if self.RECORDER is not None:
+            if stream:
+                # don't read the body of streamed responses here
+                size = int(response.headers.get('Content-Length', 0))
+            else:
+                size = len(response.content)
+            self.RECORDER.record(timestamp, self.HTTP, cmd, size,
+                                 time.perf_counter() - start)
+        return response
+
+    def _http_get(self, cmd: str) -> requests.Response:
+        with self._http_call(self._http_url(cmd)) as call:
+            return self._http_send(call, cmd)
 
     def _http_request(self, cmd: str):
         # TODO: do some checks?
@@ -278,9 +1202,67 @@ class VLC:
             return rc_do(*args, **kwargs)
         elif self.INTERFACE is self.HTTP:
             return http_do(*args, **kwargs)
+        elif self.INTERFACE is self.DUAL:
+            return self._route(rc_do, http_do, *args, **kwargs)
         else:
             raise ValueError("Interface not specified.", self.INTERFACE)
 
+    def _route(self, rc_do, http_do, *args, **kwargs):
+        """Run a command on the interface chosen by the router."""
+        command = http_do.__name__[len('_http_'):]
+        if command not in self.ROUTABLE:
+            return http_do(*args, **kwargs)
+        do = {self.RC: rc_do, self.HTTP: http_do}
+        error = NotImplementedError("No interface can run command.", command)
+        for interface in self.ROUTER.candidates(command):
+            start = time.perf_counter()
+            try:
+                result = do[interface](*args, **kwargs)
+            except NotImplementedError as e:
+                self.ROUTER.unable(command, interface)
+                error = e
+                continue
+            except VLCCancelled:
+                raise
+            except VLCTimeout:
+                # the time is up for the other interface as well
+                self.ROUTER.failed(interface)
+                raise
+            except (OSError, ValueError) as e:
+                self.ROUTER.failed(interface)
+                if command not in self.READ_ONLY:
+                    # VLC might have run the command already
+                    raise
+                # fail over to the other interface
+                error = e
+                continue
+            self.ROUTER.measured(command, interface,
+                                 time.perf_counter() - start)
+            return result
+        raise error
+
+    def _coalesce(self, key, send, value=None, delta=0) -> Future:
+        """
+        Hand a command to the coalescer, see CommandCoalescer.submit.
+
+        The deadline of the calling thread is carried over to the coalescer
+            thread. A burst is sent with the deadline of its latest command.
+        """
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is not None:
+            send = functools.partial(self._send_before, deadline, send)
+        return self.COALESCER.submit(key, send, value=value, delta=delta)
+
+    def _send_before(self, deadline: float, send: Callable, value, delta):
+        """Call <send> on the coalescer thread, limited to <deadline>."""
+        with self.deadline(deadline - time.monotonic()):
+            return send(value, delta)
+
+    def flush(self):
+        """Send all seek and volume commands held back for coalescing."""
+        if self.COALESCER is not None:
+            self.COALESCER.flush()
+
 # | add XYZ  . . . . . . . . . . . . . . . . . . . . add XYZ to playlist
 
     def _rc_add(self, mrl: MRL):
@@ -295,9 +1277,11 @@ class VLC:
 
     def _http_add(self, mrl: MRL):
         """Add <mrl> to playlist and start playback."""
-        self._http_request("in_play&input=%s" % mrl)
+        self._http_request("in_play&input=%s"
+                           % urllib.parse.quote(str(mrl), safe=''))
         self.get_playlist()
 
+    @_with_timeout
     def add(self, mrl: MRL):
         """Add <mrl> to playlist and start playback."""
         self._select_interface(self._rc_add, self._http_add, mrl)
@@ -311,23 +1295,89 @@ class VLC:
 # for fast enqueueing:
 
     def _rc_enqueue(self, mrl: MRL):
-        self._rc_send('enqueue %s' % MRL)
+        self._rc_send('enqueue %s' % mrl)
         # recache playlist
         self.get_playlist()
 
     def _http_enqueue(self, mrl: MRL):
         """Add <mrl> to playlist."""
-        self._http_request("in_enqueue&input=%s" % mrl)
+        # '&', '#' or '%' in the MRL would end or change the query
+        self._http_request("in_enqueue&input=%s"
+                           % urllib.parse.quote(str(mrl), safe=''))
         self.get_playlist()
 
+    @_with_timeout
     def enqueue(self, mrl: MRL):
         """Add <mrl> to playlist."""
         self._select_interface(self._rc_enqueue, self._http_enqueue, mrl)
 
+    @_with_timeout
+    def enqueue_many(self, mrls: Iterable, format='m3u', path=None) -> str:
+        """
+        Add all <mrls> to playlist with a single command.
+
+        The MRLs and their options are streamed into a playlist file of
+            <format> 'm3u' or 'xspf' at <path> or a new temporary file, which
+            is then enqueued. VLC has to run on the same host to read it.
+        The file is kept, since VLC might only read it later, and its path
+            is returned.
+        The cached playlist is refreshed right after the file was enqueued,
+            which is usually before VLC expanded it into its items. Call
+            get_playlist() later to see them.
+        """
+        writer = self.PLAYLIST_WRITERS[format]
+        if path is None:
+            handle, path = tempfile.mkstemp(prefix='python3-vlc-',
+                                            suffix='.' + format)
+            playlist_file = os.fdopen(handle, 'w', encoding='utf-8')
+        else:
+            playlist_file = open(path, 'w', encoding='utf-8')
+        with playlist_file:
+            writer(mrls, playlist_file)
+        self.enqueue(pathlib.Path(os.path.abspath(path)).as_uri())
+        return path
+
 # | playlist . . . . . . . . . . . . .  show items currently in playlist
 
-    def _rc_playlist(self):
+    def _rc_parse_playlist_entry(self, entry) -> dict:
+        """
+        Parse a single line of the RC playlist.
+
+        Lines have the form:
+            |   14 - Titel (00:00:33) [played 1 time]
+        Raises ValueError or IndexError if the entry is malformed.
+        """
+        splitted = entry.split(' ')
+        id = int(splitted[3])
+        if splitted[-3] == "[played":
+            duration = splitted[-4]
+            title = splitted[5:-4]
+            played = int(splitted[-2])
+        else:
+            duration = splitted[-1]
+            title = splitted[5:-1]
+            played = 0
+        if (len(duration) < 10 or duration[0] != '(' or duration[-1] != ')'
+                or duration[3] != ':' or duration[6] != ':'):
+            raise ValueError("Corrupted playlist entry.", entry)
+        etime = [int(sp) for sp in duration[1:-1].split(':')]
+        return {
+            'id': id,
+            'title': ' '.join(title),
+            'length': (etime[0] * 60 + etime[1]) * 60 + etime[2],
+            'played': played
+        }
+
+    def _rc_read_playlist(self):
+        """
+        Read and parse the RC playlist in a single pass.
+
+        Returns the list of valid entries, a list of (id, line) tuples for
+            corrupted entries and a list of lines that couldn't be parsed.
+        """
         plist = list()
+        corrupted = list()
+        unparsable = list()
         self._rc_clean_buffer()
         bufs = 67108864
         playlist_read = self._rc_get('playlist', buffersize=bufs).split('\r\n')
@@ -340,77 +1390,117 @@ class VLC:
                 endindex = i
                 break
         for entry in playlist_read[startindex:endindex]:
-            # parsing output form:
-            # |   14 - Titel (00:00:33) [played 1 time]
-            splitted = entry.split(' ')
-            if splitted[-3] == "[played":
-                if (splitted[-4][0] != '(' or splitted[-4][-1] != ')'
-                        or splitted[-4][3] != ':' or splitted[-4][6] != ':'):
-                    try:
-                        self._vlc_log("FOUND CORRUPTED ENTRY: %s" % entry)
-                        self._vlc_log("DELETING")
-                        self.delete(int(splitted[3]))
-                        continue
-                    except Exception:
-                        self._vlc_log("PLAYLIST_READ: %s" % playlist_read)
-                        self._vlc_log("PLAYLIST SERIOUSLY CORRUPTED!")
-                        self._vlc_log("CLEARING PLAYLIST NOW!")
-                        self._rc_clean_buffer()
-                        self._rc_clean_buffer()
-                        return None
-                etime = [int(sp) for sp in splitted[-4][1:-1].split(':')]
-                new_e = {
-                    'id': int(splitted[3]),
-                    'title': ' '.join(splitted[5:-4]),
-                    'length': (etime[0] * 60 + etime[1]) * 60 + etime[2],
-                    'played': int(splitted[-2])
-                }
-                plist.append(new_e)
-            else:
-                if (splitted[-1][0] != '(' or splitted[-1][-1] != ')'
-                        or splitted[-1][3] != ':' or splitted[-1][6] != ':'):
-                    try:
-                        self._vlc_log("FOUND CORRUPTED ENTRY: %s" % entry)
-                        self._vlc_log("DELETING")
-                        self.delete(int(splitted[3]))
-                        continue
-                    except Exception:
-                        self._vlc_log("PLAYLIST_READ: %s" % playlist_read)
-                        self._vlc_log("PLAYLIST SERIOUSLY CORRUPTED!")
-                        self._vlc_log("CLEARING PLAYLIST NOW!")
-                        self._rc_clean_buffer()
-                        self._rc_clean_buffer()
-                        return None
-                etime = [int(sp) for sp in splitted[-1][1:-1].split(':')]
-                new_e = {
-                    'id': int(splitted[3]),
-                    'title': ' '.join(splitted[5:-1]),
-                    'length': (etime[0] * 60 + etime[1]) * 60 + etime[2],
-                    'played': 0
-                }
-                plist.append(new_e)
+            try:
+                id = int(entry.split(' ')[3])
+            except (ValueError, IndexError):
+                unparsable.append(entry)
+                continue
+            try:
+                plist.append(self._rc_parse_playlist_entry(entry))
+            except (ValueError, IndexError):
+                corrupted.append((id, entry))
+        return plist, corrupted, unparsable
+
+    def _rc_playlist(self):
+        plist, corrupted, unparsable = self._rc_read_playlist()
+        if corrupted or unparsable:
+            removed = [id for id, entry in corrupted]
+            remaining = list()
+            if removed:
+                # delete all corrupted entries at once and refresh only once
+                self._rc_delete_batch(removed)
+                plist, still_corrupted, unparsable = self._rc_read_playlist()
+                remaining = [id for id, entry in still_corrupted]
+            self._report_playlist_repair({
+                'removed': removed,
+                'corrupted': [entry for id, entry in corrupted],
+                'remaining': remaining,
+                'unparsable': unparsable,
+            })
         return self._cache_playlist(plist)
 
+    def _report_playlist_repair(self, report: dict):
+        """
+        Store <report> of a playlist repair and pass it to the callback.
+
+        The report holds the ids of 'removed' entries, the raw lines of the
+            'corrupted' entries, the ids of entries still corrupted after
+            the repair ('remaining') and all 'unparsable' lines.
+        """
+        self.playlist_repair = report
+        if self.PLAYLIST_REPAIR_CALLBACK is not None:
+            self.PLAYLIST_REPAIR_CALLBACK(report)
+
     def _http_full_playlist(self):
         return self._http_get("requests/playlist.json").json()
 
+    def _http_iter_playlist(self):
+        """
+        Stream the items of the playlist node from playlist.json.
+
+        The response is decoded incrementally, other nodes like the media
+            library are skipped without being built in memory. The deadline
+            covers the whole download, not just the single reads.
+        """
+        cmd = "requests/playlist.json"
+        with self._http_call(self._http_url(cmd)) as call:
+            with self._http_send(call, cmd, stream=True) as response:
+                yield from _iter_json_items(response.iter_content(65536),
+                                            self.PLAYLIST_ITEMS_PATH)
+
     def _http_playlist(self):
         # playing title is marked with "'current': 'current'"
-        full_pl = self._http_full_playlist()
-        return self._cache_playlist(full_pl['children'][0]['children'])
+        return self._cache_playlist(list(self._http_iter_playlist()))
 
+    @_with_timeout
     def get_playlist(self):
         """Get the playlist."""
         return self._select_interface(self._rc_playlist, self._http_playlist)
 
     playlist = get_playlist
 
+    def _http_playlist_summary(self, current=None) -> dict:
+        """Count the streamed playlist items, without keeping them."""
+        length = 0
+        duration = 0
+        current_item = None
+        for item in self._http_iter_playlist():
+            length += 1
+            duration += max(0, int(item.get('duration', 0)))
+            if current is not None and int(item['id']) == int(current):
+                current_item = item
+        return {
+            'length': length,
+            'duration': duration,
+            'current': current_item,
+        }
+
+    def _http_shared_playlist_summary(self):
+        shared = self._shared()
+        if shared is not None:
+            return shared['playlist']
+        return self._http_playlist_summary(self._http_status()['currentplid'])
+
+    @_with_timeout
+    def get_playlist_summary(self) -> dict:
+        """
+        Get the number of items, total duration and current item.
+
+        With a shared status, the summary is read from there. The rc
+            playlist doesn't tell which item is the current one, so this
+            needs the http interface or dual_interface mode.
+        """
+        if self.INTERFACE is self.RC:
+            raise ValueError("The playlist summary needs the http interface.")
+        return self._http_shared_playlist_summary()
+
     def _cache_playlist(self, playlist):
         if not hasattr(self, 'cached_playlist') \
                        or self.cached_playlist != playlist:
             self.cached_playlist = playlist
         return self.cached_playlist
 
+    @_with_timeout
     def get_cached_playlist(self):
         """
         Get the cached playlist.
@@ -419,7 +1509,7 @@ class VLC:
         This method returns the cached playlist or caches it, if there is no
          cached playlist available.
         """
-        if self.cached_playlist is None:
+        if getattr(self, 'cached_playlist', None) is None:
             self.get_playlist()
         return self.cached_playlist
 
@@ -431,10 +1521,14 @@ class VLC:
 # | delete [X] . . . . . . . . . . . . . . . . delete item X in playlist
 
     def _rc_delete(self, id: int):
-        self._rc_send('delete %i' % id, buffersize=4096)
+        self._rc_send('delete %i' % id)
         # recache playlist
         self.get_playlist()
 
+    def _rc_delete_batch(self, ids: List[int]):
+        """Delete all <ids> with one pipelined write, without recaching."""
+        self._rc_send(''.join('delete %i\n' % int(id) for id in ids))
+
     def _http_delete(self, id: int):
         """
         Delete <id> form Playlist.
@@ -447,6 +1541,7 @@ class VLC:
         self._http_request("pl_delete&id=%i" % id)
         self.get_playlist()
 
+    @_with_timeout
     def delete(self, id: int):
         """Delete item <id> from playlist."""
         self._select_interface(self._rc_delete, self._http_delete, id)
@@ -457,43 +1552,51 @@ class VLC:
 #   KEY: id, title, artist, genre, random, duration, album
 
     def _rc_sort(self, key: str):
-        self._rc_send('delete %s' % key, buffersize=64)
+        self._rc_send('sort %s' % key)
         return self.get_playlist()
 
     def _http_sort(self, key: str):
         self._http_request("pl_sort&val=%s" % key)
         return self.get_playlist()
 
+    @_with_timeout
     def sort(self, key: str):
         """Sort playlist by sort mode <key>."""
         return self._select_interface(self._rc_sort, self._http_sort, key)
 
+    @_with_timeout
     def sort_id(self):
         """Sort playlist by id."""
         return self.sort('id')
 
+    @_with_timeout
     def sort_title(self):
         """Sort playlist by title."""
         return self.sort('title')
 
+    @_with_timeout
     def sort_artist(self):
         """Sort playlist by artist."""
         return self.sort('artist')
 
+    @_with_timeout
     def sort_genre(self):
         """Sort playlist by genre."""
         return self.sort('genre')
 
+    @_with_timeout
     def sort_random(self):
         """Randomize playlist order."""
         return self.sort('random')
 
     random_playlist = sort_random
 
+    @_with_timeout
     def sort_duration(self):
         """Sort playlist by duration."""
         self.sort('duration')
 
+    @_with_timeout
     def sort_album(self):
         """Sort playlist by album."""
         self.sort('album')
@@ -513,6 +1616,7 @@ class VLC:
         else:
             self._http_request('pl_play&id=%i' % int(id))
 
+    @_with_timeout
     def play(self, id=None):
         """
         Play Title with playlist id <id>.
@@ -529,6 +1633,7 @@ class VLC:
     def _http_stop(self):
         self._http_request('pl_stop')
 
+    @_with_timeout
     def stop(self):
         """Stop playback."""
         self._select_interface(self._rc_stop, self._http_stop)
@@ -541,6 +1646,7 @@ class VLC:
     def _http_next(self):
         self._http_request('pl_next')
 
+    @_with_timeout
     def next(self):
         """Jump to next item in playlist."""
         self._select_interface(self._rc_next, self._http_next)
@@ -553,6 +1659,7 @@ class VLC:
     def _http_previous(self):
         self._http_request('pl_previous')
 
+    @_with_timeout
     def previous(self):
         """Jump to previous item in playlist."""
         self._select_interface(self._rc_previous, self._http_previous)
@@ -573,10 +1680,11 @@ class VLC:
             self._rc_send("repeat %s" % ("on" if repeat else "off"))
 
     def _http_repeat(self, repeat: bool=None):
-        if repeat is None or self._http_get_repeat() ^ repeat:
+        if repeat is None or self._http_fetch_status()['repeat'] ^ repeat:
             # toggle if current status and desired status differ
             self._http_request('pl_repeat')
 
+    @_with_timeout
     def repeat(self, repeat: bool=None):
         """
         Activate/Deactivate repeating.
@@ -596,6 +1704,7 @@ class VLC:
     def _http_get_repeat(self) -> bool:
         return self._http_status()['repeat']
 
+    @_with_timeout
     def get_repeat(self) -> bool:
         """Get playlist repeat status."""
         return self._select_interface(self._rc_get_repeat,
@@ -612,10 +1721,11 @@ class VLC:
             self._rc_send("loop %s" % ("on" if loop else "off"))
 
     def _http_loop(self, loop: bool=None):
-        if loop is None or self._http_get_loop() ^ loop:
+        if loop is None or self._http_fetch_status()['loop'] ^ loop:
             # toggle if current status and desired status differ
             self._http_request('pl_loop')
 
+    @_with_timeout
     def loop(self, loop: bool=None):
         """
         Activate/Deactivate looping playlist.
@@ -634,6 +1744,7 @@ class VLC:
     def _http_get_loop(self) -> bool:
         return self._http_status()['loop']
 
+    @_with_timeout
     def get_loop(self) -> bool:
         """Get playlist loop status."""
         return self._select_interface(self._rc_get_loop, self._http_get_loop)
@@ -649,10 +1760,11 @@ class VLC:
             self._rc_send("random %s" % ("on" if random else "off"))
 
     def _http_random(self, random: bool=None):
-        if random is None or self._http_get_random() ^ random:
+        if random is None or self._http_fetch_status()['random'] ^ random:
             # toggle if current status and desired status differ
             self._http_request('pl_random')
 
+    @_with_timeout
     def random(self, random: bool=None):
         """
         Activate/Deactivate  random playback.
@@ -671,6 +1783,7 @@ class VLC:
     def _http_get_random(self) -> bool:
         return self._http_status()['random']
 
+    @_with_timeout
     def get_random(self) -> bool:
         """Get playlist loop status."""
         return self._select_interface(self._rc_get_random,
@@ -687,6 +1800,7 @@ class VLC:
         self._http_request('pl_empty')
         self.get_playlist()
 
+    @_with_timeout
     def clear(self):
         """Empty the playlist."""
         self._select_interface(self._rc_clear, self._http_empty)
@@ -699,9 +1813,49 @@ class VLC:
     def _rc_status(self):
         return self._rc_get('status', buffersize=4096)
 
-    def _http_status(self):
+    def _http_fetch_status(self):
         return self._http_request("").json()
 
+    def _http_status(self):
+        # a shared status can be up to max_age old, so it is only used by
+        #  plain getters; deciding on a toggle uses _http_fetch_status
+        shared = self._shared()
+        if shared is not None:
+            return shared['status']
+        return self._http_fetch_status()
+
+    def _shared(self):
+        """Get the shared status and playlist summary, None if unavailable."""
+        if self.SHARED_STATUS is None:
+            return None
+        if self._shared_poller is None and self.SHARED_STATUS.elect():
+            self._shared_poller = threading.Thread(target=self._shared_poll,
+                                                   daemon=True)
+            self._shared_poller.start()
+        return self.SHARED_STATUS.read()
+
+    def _shared_poll(self):
+        """Keep the shared status up to date, runs in the elected process."""
+        polls = 0
+        current = None
+        summary = None
+        while self.SHARED_STATUS.poller:
+            try:
+                status = self._http_fetch_status()
+                if (summary is None or status['currentplid'] != current
+                        or polls % self.SUMMARY_POLLS == 0):
+                    current = status['currentplid']
+                    summary = self._http_playlist_summary(current)
+                self.SHARED_STATUS.write({
+                    'status': status,
+                    'playlist': summary,
+                })
+            except Exception as e:
+                self._vlc_log("SHARED STATUS POLL FAILED: %s" % e)
+            polls += 1
+            time.sleep(self.SHARED_STATUS.interval)
+
+    @_with_timeout
     def status(self):
         """Get vlc status information."""
         return self._select_interface(self._rc_status, self._http_status)
@@ -720,15 +1874,26 @@ class VLC:
 # | seek X . . . . . . . . . . . seek in seconds, for instance `seek 12'
 
     def _rc_seek(self, time: int):
-        self._rc_send('title %i' % int(time))
+        self._rc_send('seek %i' % int(time))
 
     def _http_seek(self, time: int):
         self._http_request('seek&val=%i' % int(time))
 
-    def seek(self, time: int):
-        """Seek in seconds (jump to position)."""
+    def _send_seek(self, time: int, delta=0):
         self._select_interface(self._rc_seek, self._http_seek, time)
 
+    @_with_timeout
+    def seek(self, time: int):
+        """
+        Seek in seconds (jump to position).
+
+        With coalescing enabled only the latest seek of a burst is sent and
+            a Future is returned.
+        """
+        if self.COALESCER is not None:
+            return self._coalesce('seek', self._send_seek, value=int(time))
+        self._send_seek(time)
+
 # | pause  . . . . . . . . . . . . . . . . . . . . . . . .  toggle pause
 
     def _rc_pause(self, id=None):
@@ -743,6 +1908,7 @@ class VLC:
         else:
             self._http_request('pl_pause&id=%i' % int(id))
 
+    @_with_timeout
     def pause(self, id=None):
         """
         Pause and jump to title with playlist id <id>.
@@ -759,7 +1925,97 @@ class VLC:
 # | frame  . . . . . . . . . . . . . . . . . . . . . play frame by frame
 # | fullscreen, f, F [on|off]  . . . . . . . . . . . . toggle fullscreen
 # | info . . . . . . . . . . . . .  information about the current stream
+
+    def _rc_stream_info(self) -> dict:
+        # parsing output form:
+        # +----[ Stream 0 ]
+        # | Codec: MPEG Audio layer 1/2 (mpga)
+        # the http interface calls the 'Meta data' category 'meta'
+        info = dict()
+        category = None
+        for line in self._rc_get('info', buffersize=65536).splitlines():
+            if line.startswith('+----[ '):
+                name = line[len('+----[ '):].rstrip(' ]')
+                if name == 'Meta data':
+                    name = 'meta'
+                category = None if name.startswith('end of') else dict()
+                if category is not None:
+                    info[name] = category
+            elif category is not None and line.startswith('| '):
+                key, sep, value = line[2:].partition(': ')
+                if sep:
+                    category[key] = value
+        return info
+
+    def _http_stream_info(self) -> dict:
+        information = self._http_status().get('information') or dict()
+        return information.get('category') or dict()
+
+    @_with_timeout
+    def get_stream_info(self) -> dict:
+        """
+        Get information about the current stream.
+
+        Returns a dict of categories like 'meta' or 'Stream 0', each holding
+            a dict of the reported values as strings.
+        """
+        return self._select_interface(self._rc_stream_info,
+                                      self._http_stream_info)
+
 # | stats  . . . . . . . . . . . . . . . .  show statistical information
+
+    def _rc_stats(self) -> StreamStats:
+        # parsing output form:
+        # | input bytes read :      360 KiB
+        # | input bitrate    :      128 kb/s
+        values = dict()
+        for line in self._rc_get('stats', buffersize=4096).splitlines():
+            label, sep, value = line.lstrip('| ').partition(':')
+            field = self.RC_STATS.get(label.strip())
+            if field is None or not sep:
+                continue
+            value = value.split()
+            number = float(value[0])
+            if len(value) > 1 and value[1] == 'KiB':
+                number *= 1024
+            values[field] = number
+        if not values:
+            # nothing is playing
+            return None
+        return self._stream_stats(values)
+
+    def _http_stats(self) -> StreamStats:
+        stats = self._http_status().get('stats')
+        if not stats:
+            return None
+        values = dict()
+        for key, value in stats.items():
+            field = self.HTTP_STATS.get(key.replace('_', '').lower())
+            if field is not None:
+                values[field] = float(value)
+        for field in ('input_bitrate', 'demux_bitrate'):
+            # status.json reports bytes per microsecond
+            if field in values:
+                values[field] *= 8000
+        return self._stream_stats(values)
+
+    def _stream_stats(self, values: dict) -> StreamStats:
+        return StreamStats(time=time.time(), **{
+            field: (values.get(field, 0.0) if field.endswith('bitrate')
+                    else int(values.get(field, 0)))
+            for field in StreamStats._fields if field != 'time'
+        })
+
+    @_with_timeout
+    def get_stats(self) -> StreamStats:
+        """
+        Get statistics of the current input as StreamStats.
+
+        Returns None if nothing is playing. Rates like frames lost per second
+            can be computed with StreamStats.rates.
+        """
+        return self._select_interface(self._rc_stats, self._http_stats)
+
 # | rate [playback rate] . . . . . . . . . .  set playback rate to value
 # | get_time . . . . . . . . .  seconds elapsed since stream's beginning
 
@@ -772,6 +2028,7 @@ class VLC:
         position = float(status['position'])
         return int(title_length * position)
 
+    @_with_timeout
     def get_time(self) -> int:
         """Get seconds elapsed since stream's beginning."""
         return self._select_interface(self._rc_get_time, self._http_get_time)
@@ -787,6 +2044,7 @@ class VLC:
         """Get position in current stream (between 0..1)."""
         return float(self._http_status()['position'])
 
+    @_with_timeout
     def get_position(self) -> float:
         """Get position in current stream (between 0..1)."""
         return self._select_interface(self._rc_get_position,
@@ -802,6 +2060,7 @@ class VLC:
     def _http_is_playing(self) -> bool:
         return (self._http_status()['state'] == 'playing')
 
+    @_with_timeout
     def is_playing(self) -> bool:
         """Get playing status."""
         return self._select_interface(self._rc_is_playing,
@@ -816,6 +2075,7 @@ class VLC:
     def _http_is_stopped(self) -> bool:
         return (self._http_status()['state'] == 'stopped')
 
+    @_with_timeout
     def is_stopped(self) -> bool:
         """Get playing status."""
         return self._select_interface(self._rc_is_stopped,
@@ -830,6 +2090,7 @@ class VLC:
     def _http_is_paused(self) -> bool:
         return (self._http_status()['state'] == 'paused')
 
+    @_with_timeout
     def is_paused(self) -> bool:
         """Get playing status."""
         return self._select_interface(self._rc_is_paused, self._http_is_paused)
@@ -849,11 +2110,12 @@ class VLC:
 
     def _http_get_current_id(self):
         """Get the it of currently playing title."""
-        return self._http_request('').json()['currentplid']
+        return self._http_status()['currentplid']
 
     def _http_get_title(self) -> dict:
         return self._http_get_title_by_id(self._http_get_current_id())
 
+    @_with_timeout
     def get_title(self):
         """Return currently playing title."""
         return self._select_interface(self._rc_get_title, self._http_get_title)
@@ -864,8 +2126,9 @@ class VLC:
         return int(self._rc_get('get_title', buffersize=1024))
 
     def _http_get_length(self):
-        return self._http_request('').json()['length']
+        return self._http_status()['length']
 
+    @_with_timeout
     def get_length(self):
         """Get the length of playing title in seconds."""
         return self._select_interface(self._rc_get_length,
@@ -879,26 +2142,52 @@ class VLC:
         return int(self._rc_get('volume', buffersize=4096))
 
     def _http_get_volume(self) -> int:
-        return int(self._http_request('').json()['volume'])
+        return int(self._http_status()['volume'])
 
+    @_with_timeout
     def get_volume(self) -> int:
         """Get the volume."""
         return self._select_interface(self._rc_get_volume,
                                       self._http_get_volume)
 
+    def _clamp_volume(self, volume) -> int:
+        return max(0, min(self.VOLUME_MAX, int(volume)))
+
     def _rc_set_volume(self, volume) -> int:
         return int(self._rc_get('volume %i' % int(volume), buffersize=4096))
 
     def _http_set_volume(self, volume) -> int:
+        # the answer holds the volume before the change, so the result is
+        #  taken from the requested value instead of asking a second time
         self._http_request('volume&val=%i' % int(volume))
-        # need to redo the request, because first request returns volume
-        #  before change
-        return self._http_get_volume()
-
+        return self._clamp_volume(volume)
+
+    def _send_volume(self, volume=None, delta=0) -> int:
+        """Set <volume> and/or change it by <delta> with a single command."""
+        if volume is not None:
+            return self._select_interface(self._rc_set_volume,
+                                          self._http_set_volume,
+                                          self._clamp_volume(volume + delta))
+        elif delta > 0:
+            return self._select_interface(self._rc_volup, self._http_volup,
+                                          delta)
+        elif delta < 0:
+            return self._select_interface(self._rc_voldown,
+                                          self._http_voldown, -delta)
+        return self.get_volume()
+
+    @_with_timeout
     def set_volume(self, volume) -> int:
-        """Set the volume."""
-        return self._select_interface(self._rc_set_volume,
-                                      self._http_set_volume, volume)
+        """
+        Set the volume.
+
+        With coalescing enabled only the latest volume of a burst is sent
+            and a Future is returned.
+        """
+        if self.COALESCER is not None:
+            return self._coalesce('volume', self._send_volume,
+                                  value=int(volume))
+        return self._send_volume(int(volume))
 
 # | volup [X]  . . . . . . . . . . . . . . .  raise audio volume X steps
 
@@ -906,12 +2195,20 @@ class VLC:
         return int(self._rc_get('volup %i' % (x), buffersize=1024))
 
     def _http_volup(self, x) -> int:
-        self._http_request('volume&val=+%i' % int(x))
-        return self._http_get_volume()
+        status = self._http_request('volume&val=+%i' % int(x)).json()
+        return self._clamp_volume(int(status['volume']) + int(x))
 
+    @_with_timeout
     def volup(self, x) -> int:
-        """Increase the volume by x."""
-        return self._select_interface(self._rc_volup, self._http_volup, x)
+        """
+        Increase the volume by x.
+
+        With coalescing enabled all steps of a burst are summed up into one
+            command and a Future is returned.
+        """
+        if self.COALESCER is not None:
+            return self._coalesce('volume', self._send_volume, delta=int(x))
+        return self._send_volume(delta=int(x))
 
 # | voldown [X]  . . . . . . . . . . . . . .  lower audio volume X steps
 
@@ -919,12 +2216,20 @@ class VLC:
         return int(self._rc_get('voldown %i' % (x), buffersize=1024))
 
     def _http_voldown(self, x) -> int:
-        self._http_request('volume&val=-%i' % int(x))
-        return self._http_get_volume()
+        status = self._http_request('volume&val=-%i' % int(x)).json()
+        return self._clamp_volume(int(status['volume']) - int(x))
 
+    @_with_timeout
     def voldown(self, x) -> int:
-        """Decrease the volume by x."""
-        return self._select_interface(self._rc_voldown, self._http_voldown, x)
+        """
+        Decrease the volume by x.
+
+        With coalescing enabled all steps of a burst are summed up into one
+            command and a Future is returned.
+        """
+        if self.COALESCER is not None:
+            return self._coalesce('volume', self._send_volume, delta=-int(x))
+        return self._send_volume(delta=-int(x))
 
 # | achan [X]  . . . . . . . . . . . .  set/get stereo audio output mode
 # | atrack [X] . . . . . . . . . . . . . . . . . . . set/get audio track
@@ -954,9 +2259,684 @@ class VLC:
     # | clean - - - empty the recv buffer
 
     def _rc_clean_buffer(self):
+        with self.RC_LOCK:
+            self._rc_sync(self._deadline(), self._generation)
+
+
+def replay_trace(trace: List[dict], player: VLC, speed: float=1.0) -> dict:
+    """
+    Replay a recorded <trace> against <player> and measure it.
+
+    The gaps between the commands are kept at <speed> times the recorded
+        speed. If <speed> is None or 0 the commands are sent as fast as
+        possible. Commands recorded for another interface than the one of
+        <player> are skipped, unless <player> uses dual_interface mode.
+    Returns the number of sent, skipped and failed commands, the duration,
+        the throughput in commands per second and latency percentiles in
+        seconds.
+    """
+    latencies = list()
+    skipped = 0
+    errors = 0
+    first = trace[0]['timestamp'] if trace else 0
+    start = time.perf_counter()
+    for entry in trace:
+        if player.INTERFACE not in (entry['interface'], VLC.DUAL):
+            skipped += 1
+            continue
+        if speed:
+            delay = (entry['timestamp'] - first) / speed \
+                - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        sent = time.perf_counter()
+        try:
+            if entry['interface'] == VLC.HTTP:
+                player._http_get(entry['command'])
+            elif entry['size']:
+                player._rc_get(entry['command'], buffersize=entry['size'])
+            else:
+                player._rc_send(entry['command'])
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - sent)
+    duration = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+    return {
+        'sent': len(latencies),
+        'skipped': skipped,
+        'errors': errors,
+        'duration': duration,
+        'throughput': len(latencies) / duration if duration else None,
+        'latency': {
+            'mean': sum(latencies) / len(latencies) if latencies else None,
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+            'p99': percentile(0.99),
+            'max': latencies[-1] if latencies else None,
+        },
+    }
+
+
+def read_queue_file(path: str):
+    """Stream MRLs from the file at <path>, one per line."""
+    with open(path) as queue_file:
+        for line in queue_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+class QueueFeeder:
+    """
+    Feed a long client-side queue into VLC through a small window.
+
+    Only the <ahead> items following the current one are enqueued in VLC.
+        Every step() reads 'currentplid' from the status, deletes the
+        played items except the last <behind> ones and tops the window up
+        from <items>. So the playlist of VLC keeps a constant size, no matter
+        how long the queue is.
+    If VLC reached the end of its playlist before the next step(), the
+        whole window counts as played and playback resumes with the first
+        item enqueued after it. While an item outside the window plays,
+        e.g. one the user picked, the feeder leaves VLC alone.
+    <items> can be any iterable of MRLs, e.g. read_queue_file(path).
+    The status needs to be structured, so the player has to use the http
+        interface or dual_interface mode.
+    """
+
+    def __init__(self,
+                 player: VLC,
+                 items: Iterable,
+                 ahead: int=5,
+                 behind: int=1) -> None:
+        """Create a feeder for <player>, nothing is enqueued yet."""
+        self.player = player
+        self.ahead = ahead
+        self.behind = behind
+        self.window = list()
+        self.exhausted = False
+        # played past the window with nothing left to resume
+        self.drained = False
+        self._items = iter(items)
+
+    def _playlist_ids(self) -> set:
+        return set(int(item['id'])
+                   for item in self.player.get_cached_playlist())
+
+    def _enqueue_next(self) -> bool:
+        """Enqueue the next item of the queue, False if it's exhausted."""
+        for mrl in self._items:
+            before = self._playlist_ids()
+            self.player.enqueue(mrl)
+            new = self._playlist_ids() - before
+            if new:
+                self.window.append(max(new))
+                return True
+            self.player._vlc_log("COULD NOT ENQUEUE: %s" % mrl)
+        self.exhausted = True
+        return False
+
+    def step(self) -> int:
+        """
+        Prune played items and top up the window.
+
+        Returns the playlist id of the current item.
+        """
+        current = int(self.player.status()['currentplid'])
+        resume = None
+        if current in self.window:
+            self._prune(self.window.index(current) - self.behind)
+            upcoming = len(self.window) - self.window.index(current) - 1
+        elif current == -1 and self.window:
+            # VLC played past the end of the playlist, so everything in the
+            #  window counts as played
+            self._prune(len(self.window) - self.behind)
+            resume = len(self.window)
+            # the first new item becomes the current one
+            upcoming = -1
+        elif self.window:
+            # something outside the window plays, wait until it's over
+            return current
+        else:
+            # start() plays the first item
+            upcoming = -1
+        while upcoming < self.ahead and self._enqueue_next():
+            upcoming += 1
+        if resume is not None:
+            if resume < len(self.window):
+                current = self.window[resume]
+                self.player.play(current)
+            else:
+                self.drained = True
+        return current
+
+    def _prune(self, played: int):
+        """Delete the first <played> items of the window from VLC."""
+        played = max(0, played)
+        for id in self.window[:played]:
+            self.player.delete(id)
+        del self.window[:played]
+
+    def start(self):
+        """Fill the window and start playing its first item."""
+        self.step()
+        if self.window:
+            self.player.play(self.window[0])
+
+    def finished(self, current: int) -> bool:
+        """Whether the queue is exhausted and <current> is the last item."""
+        return self.drained or self.exhausted and (not self.window or
+                                                   current == self.window[-1])
+
+    def run(self, interval: float=1.0, stop: threading.Event=None):
+        """
+        Start playing and keep the window filled.
+
+        Returns when the last item of the queue is playing or was played,
+            or when <stop> is set.
+        """
+        stop = stop or threading.Event()
+        self.start()
+        while not stop.wait(interval):
+            if self.finished(self.step()):
+                break
+
+
+class TelemetryRecorder:
+    """
+    Sample the playback status of a player into fixed-size ring buffers.
+
+    Every sample stores the time, position, state, currentplid, volume and
+        rate in typed arrays instead of dicts, so a recorder always uses
+        about 23 bytes per sample of <capacity>. When the buffers are full,
+        the oldest samples are overwritten.
+    The status needs to be structured, so the player has to use the http
+        interface or dual_interface mode. Every sample fetches a fresh
+        status, as a shared copy can repeat itself and would show up as
+        stalls.
+    """
+
+    STATES = {'stopped': 0, 'playing': 1, 'paused': 2}
+    # name and array typecode of every field
+    FIELDS = [('time', 'd'), ('position', 'f'), ('state', 'b'),
+              ('currentplid', 'i'), ('volume', 'h'), ('rate', 'f')]
+
+    def __init__(self,
+                 player: VLC,
+                 rate: float=10.0,
+                 capacity: int=36000) -> None:
+        """Record <rate> samples per second, keeping the last <capacity>."""
+        self.player = player
+        self.rate = rate
+        self.capacity = capacity
+        self.buffers = {name: array.array(typecode, [0]) * capacity
+                        for name, typecode in self.FIELDS}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def sample(self):
+        """Read the status once and store it."""
+        status = self.player._http_fetch_status()
+        with self._lock:
+            index = self._next
+            self.buffers['time'][index] = time.time()
+            self.buffers['position'][index] = float(status['position'])
+            self.buffers['state'][index] = self.STATES.get(status['state'],
+                                                           -1)
+            self.buffers['currentplid'][index] = int(status['currentplid'])
+            self.buffers['volume'][index] = int(status['volume'])
+            self.buffers['rate'][index] = float(status['rate'])
+            self._next = (index + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def _run(self):
+        interval = 1.0 / self.rate
+        next_sample = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                self.player._vlc_log("TELEMETRY SAMPLE FAILED: %s" % e)
+            next_sample += interval
+            self._stop.wait(max(0, next_sample - time.monotonic()))
+
+    def start(self):
+        """Start sampling in a background thread."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def window(self, start: float=None, end: float=None) -> dict:
+        """
+        Get all samples taken between the timestamps <start> and <end>.
+
+        Returns a dict of arrays per field, oldest sample first.
+        """
+        with self._lock:
+            first = (self._next - self._count) % self.capacity
+            indices = [(first + i) % self.capacity for i in range(self._count)]
+            times = self.buffers['time']
+            indices = [i for i in indices
+                       if (start is None or times[i] >= start) and
+                       (end is None or times[i] <= end)]
+            return {name: array.array(typecode,
+                                      (self.buffers[name][i] for i in indices))
+                    for name, typecode in self.FIELDS}
+
+    def aggregate(self, start: float=None, end: float=None) -> dict:
+        """
+        Summarize the samples between <start> and <end>.
+
+        'stalls' counts samples which were playing without the position
+            moving, 'skips' changes of the current item and
+            'volume_changes' changes of the volume.
+        """
+        samples = self.window(start, end)
+        count = len(samples['time'])
+        stalls = skips = volume_changes = 0
+        for i in range(1, count):
+            if samples['currentplid'][i] != samples['currentplid'][i - 1]:
+                skips += 1
+            elif (samples['state'][i] == self.STATES['playing'] and
+                  samples['state'][i - 1] == self.STATES['playing'] and
+                  samples['position'][i] == samples['position'][i - 1]):
+                stalls += 1
+            if samples['volume'][i] != samples['volume'][i - 1]:
+                volume_changes += 1
+        playing = sum(1 for state in samples['state']
+                      if state == self.STATES['playing'])
+        return {
+            'samples': count,
+            'start': samples['time'][0] if count else None,
+            'end': samples['time'][-1] if count else None,
+            'playing': playing / count if count else None,
+            'stalls': stalls,
+            'skips': skips,
+            'volume_changes': volume_changes,
+            'mean_rate': sum(samples['rate']) / count if count else None,
+        }
+
+    def to_csv(self, file: IO, start: float=None, end: float=None):
+        """Write the samples between <start> and <end> to open <file>."""
+        samples = self.window(start, end)
+        names = [name for name, typecode in self.FIELDS]
+        writer = csv.writer(file)
+        writer.writerow(names)
+        writer.writerows(zip(*(samples[name] for name in names)))
+
+    def to_numpy(self, start: float=None, end: float=None):
+        """Get the samples between <start> and <end> as structured array."""
+        import numpy
+        samples = self.window(start, end)
+        result = numpy.zeros(len(samples['time']),
+                             dtype=[(name, typecode)
+                                    for name, typecode in self.FIELDS])
+        for name, typecode in self.FIELDS:
+            result[name] = numpy.frombuffer(samples[name],
+                                            dtype=typecode)
+        return result
+
+
+class Cue:
+    """A VLC command scheduled for a wall clock time, see CueScheduler."""
+
+    def __init__(self, player: VLC, target: float, method: str, args,
+                 kwargs) -> None:
+        """Create a cue calling <player>.<method> at timestamp <target>."""
+        self.player = player
+        self.target = target
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        # target on the monotonic clock, which is used for waiting
+        self.monotonic = time.monotonic() + target - time.time()
+        self.sent = None
+        self.rtt = None
+        self.estimated_skew = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout: float=None) -> bool:
+        """Wait until the cue was sent, True if it was."""
+        return self.done.wait(timeout)
+
+
+class CueScheduler:
+    """
+    Run VLC commands at precise wall clock times.
+
+    The round trip time of every player is estimated from the commands sent
+        to it, smoothed with an exponential moving average. A command takes
+        effect about half a round trip after it was sent, so each cue is
+        sent that much before its target. The last <spin> seconds before
+        sending are busy-waited for precision.
+    Every player gets its own thread, so a slow player doesn't delay cues
+        of the others. When a cue was sent, its 'estimated_skew' holds the
+        time it probably took effect minus its target, in seconds, and
+        <callback> is called with it. It assumes VLC acted right in the
+        middle of the round trip, so it isn't a measurement.
+    Players using command coalescing delay seek and volume commands by
+        their window, so they shouldn't be used here.
+    Players using only the rc interface are not supported: rc commands
+        return without waiting for VLC's answer, so there is no round trip
+        to measure. Use http or dual_interface mode.
+    """
+
+    def __init__(self,
+                 alpha: float=0.2,
+                 spin: float=0.002,
+                 callback: Callable=None) -> None:
+        """Create a scheduler, threads are started for the first cues."""
+        self.alpha = alpha
+        self.spin = spin
+        self.callback = callback
+        self.rtts = dict()
+        self._lanes = dict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cues = 0
+
+    def rtt(self, player: VLC) -> float:
+        """Get the estimated round trip time to <player> in seconds."""
+        return self.rtts.get(player, 0.0)
+
+    def _measured(self, player: VLC, rtt: float):
+        if player in self.rtts:
+            rtt = self.alpha * rtt + (1 - self.alpha) * self.rtts[player]
+        self.rtts[player] = rtt
+
+    def calibrate(self, player: VLC, samples: int=5) -> float:
+        """Estimate the round trip time with <samples> status requests."""
+        for _ in range(samples):
+            start = time.monotonic()
+            player.status()
+            self._measured(player, time.monotonic() - start)
+        return self.rtt(player)
+
+    def schedule(self, target: float, player: VLC, method: str, *args,
+                 **kwargs) -> Cue:
+        """Call <player>.<method>(*args, **kwargs) at timestamp <target>."""
+        if player.INTERFACE is VLC.RC:
+            raise ValueError("rc-only players are not supported.")
+        cue = Cue(player, target, method, args, kwargs)
+        with self._lock:
+            if self._closed:
+                raise ValueError("Scheduler is closed.")
+            lane = self._lanes.get(player)
+            if lane is None:
+                lane = {'heap': list(), 'cond': threading.Condition()}
+                lane['thread'] = threading.Thread(target=self._run,
+                                                  args=(player, lane),
+                                                  daemon=True)
+                self._lanes[player] = lane
+                lane['thread'].start()
+            self._cues += 1
+            # pushed under the scheduler lock, so close() can't miss it
+            with lane['cond']:
+                heapq.heappush(lane['heap'],
+                               (cue.monotonic, self._cues, cue))
+                lane['cond'].notify()
+        return cue
+
+    def _run(self, player: VLC, lane: dict):
         while True:
+            with lane['cond']:
+                while True:
+                    if self._closed:
+                        return
+                    if lane['heap']:
+                        cue = lane['heap'][0][2]
+                        send_at = cue.monotonic - self.rtt(player) / 2
+                        wait = send_at - time.monotonic() - self.spin
+                        if wait <= 0:
+                            heapq.heappop(lane['heap'])
+                            break
+                        lane['cond'].wait(wait)
+                    else:
+                        lane['cond'].wait()
+            while time.monotonic() < send_at:
+                # releases the GIL, so other threads aren't starved
+                time.sleep(0)
+            self._send(cue)
+
+    def _send(self, cue: Cue):
+        cue.sent = time.time()
+        start = time.monotonic()
+        try:
+            cue.result = getattr(cue.player, cue.method)(*cue.args,
+                                                         **cue.kwargs)
+            if isinstance(cue.result, Future):
+                cue.result = cue.result.result()
+        except Exception as e:
+            cue.error = e
+        cue.rtt = time.monotonic() - start
+        cue.estimated_skew = start + cue.rtt / 2 - cue.monotonic
+        if cue.error is None:
+            self._measured(cue.player, cue.rtt)
+        cue.done.set()
+        if self.callback is not None:
+            self.callback(cue)
+
+    def close(self):
+        """
+        Stop all threads.
+
+        Cues not sent yet get a VLCCancelled error and are marked done, so
+            nobody waits for them forever. The callback isn't called for
+            them.
+        """
+        with self._lock:
+            self._closed = True
+            lanes = list(self._lanes.values())
+        for lane in lanes:
+            with lane['cond']:
+                lane['cond'].notify()
+            lane['thread'].join()
+            with lane['cond']:
+                cues = [cue for _, _, cue in sorted(lane['heap'])]
+                lane['heap'].clear()
+            for cue in cues:
+                cue.error = VLCCancelled("Scheduler was closed.")
+                cue.done.set()
+
+
+def benchmark_enqueue(player: VLC, mrls: List, format='m3u') -> dict:
+    """
+    Compare enqueueing <mrls> one by one with VLC.enqueue_many.
+
+    The playlist of <player> is cleared before each run and afterwards,
+        the generated playlist file is removed at the end.
+    Returns the seconds and the number of commands sent for 'per_item' and
+        'bulk'.
+    """
+    results = dict()
+    recorder = player.RECORDER
+    path = None
+    try:
+        for name in ('per_item', 'bulk'):
+            player.clear()
+            trace = io.StringIO()
+            player.RECORDER = TraceRecorder(trace)
+            start = time.perf_counter()
+            if name == 'bulk':
+                path = player.enqueue_many(mrls, format=format)
+            else:
+                for mrl in mrls:
+                    player.enqueue(mrl)
+            results[name] = {
+                'seconds': time.perf_counter() - start,
+                # minus the csv header
+                'commands': len(trace.getvalue().splitlines()) - 1,
+            }
+    finally:
+        player.RECORDER = recorder
+        player.clear()
+        if path is not None:
+            os.unlink(path)
+    return results
+
+
+class VLCDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Local daemon sharing VLC connections between many clients.
+
+    The daemon owns one VLC object per configured instance, so the
+        screen lookup and the connection only happen once. Clients talk to
+        it through a unix socket with one JSON object per line:
+        {"instance": "default", "method": "play", "args": [3]}
+        and get {"result": ...} or {"error": "..."} back.
+    Calls to the same instance are serialized. 'status' is answered from a
+        cache for <status_ttl> seconds, so polling clients share requests.
+    """
+
+    daemon_threads = True
+    # public VLC methods clients may call; deadline() and cancel() only make
+    # sense inside one process and enqueue_many() could write to any <path>
+    METHODS = frozenset({
+        'add', 'enqueue', 'get_playlist', 'get_playlist_summary',
+        'get_cached_playlist', 'delete', 'sort', 'sort_id', 'sort_title',
+        'sort_artist', 'sort_genre', 'sort_random', 'sort_duration',
+        'sort_album', 'play', 'stop', 'next', 'previous', 'repeat',
+        'get_repeat', 'loop', 'get_loop', 'random', 'get_random', 'clear',
+        'status', 'seek', 'pause', 'get_stream_info', 'get_stats', 'get_time',
+        'get_position', 'is_playing', 'is_stopped', 'is_paused', 'get_title',
+        'get_length', 'get_volume', 'set_volume', 'volup', 'voldown', 'flush',
+        'playlist', 'random_playlist', 'empty', 'time', 'position', 'length',
+    })
+
+    def __init__(self,
+                 instances: dict,
+                 path: str=DAEMON_SOCKET,
+                 status_ttl: float=0.2) -> None:
+        """
+        Create a daemon listening on unix socket <path>.
+
+        <instances> maps instance names to keyword arguments for VLC. The
+            VLC objects are created on first use.
+        """
+        self.instances = instances
+        self.status_ttl = status_ttl
+        self._players = dict()
+        self._locks = dict()
+        self._status = dict()
+        self._players_lock = threading.Lock()
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _DaemonHandler)
+
+    def _player(self, instance: str):
+        with self._players_lock:
+            if instance not in self._players:
+                if instance not in self.instances:
+                    raise DaemonError("Unknown instance.", instance)
+                self._locks[instance] = threading.Lock()
+                self._players[instance] = VLC(**self.instances[instance])
+            return self._players[instance], self._locks[instance]
+
+    def call(self, instance: str, method: str, args=(), kwargs=None):
+        """Call <method> of <instance>, return a JSON serializable result."""
+        if method not in self.METHODS:
+            raise DaemonError("Unknown method.", method)
+        player, lock = self._player(instance)
+        with lock:
+            if method == 'status' and not args and not kwargs:
+                cached = self._status.get(instance)
+                if cached is not None and \
+                        time.monotonic() - cached[0] < self.status_ttl:
+                    return cached[1]
+            result = getattr(player, method)(*args, **(kwargs or {}))
+            if isinstance(result, Future):
+                result = result.result()
+            if hasattr(result, '_asdict'):
+                # NamedTuples like StreamStats would become plain lists
+                result = result._asdict()
+            if method == 'status':
+                self._status[instance] = (time.monotonic(), result)
+            elif not method.startswith(('get_', 'is_')):
+                # commands might change the status
+                self._status.pop(instance, None)
+        return result
+
+    def server_close(self):
+        """Stop listening and remove the socket file."""
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
             try:
-                self._vlc_log(" clean : " +
-                              self.SOCK.recv(4096).decode('utf-8'))
-            except Exception:
-                break
+                request = json.loads(line.decode('utf-8'))
+                result = self.server.call(request.get('instance', 'default'),
+                                          request['method'],
+                                          request.get('args', ()),
+                                          request.get('kwargs'))
+                answer = json.dumps({'result': result})
+            except Exception as e:
+                answer = json.dumps({'error': '%s: %s' % (type(e).__name__,
+                                                          e)})
+            self.wfile.write(answer.encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+def serve(argv=None, path: str=DAEMON_SOCKET, instance: str='default'):
+    """
+    Run a VLCDaemon for one instance until interrupted.
+
+    <argv> holds the daemon options, see 'python -m vlc daemon --help'.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m vlc daemon',
+                                     description=serve.__doc__)
+    parser.add_argument('--screen-name', default='vlc_screen')
+    parser.add_argument('--interface', default='http', choices=['http', 'rc'])
+    parser.add_argument('--http-host', default='localhost')
+    parser.add_argument('--http-port', type=int, default=8080)
+    parser.add_argument('--http-password', default='pass')
+    parser.add_argument('--rc-host', default='localhost')
+    parser.add_argument('--rc-port', type=int, default=8888)
+    parser.add_argument('--status-ttl', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    server = VLCDaemon({instance: {
+        'screen_name': args.screen_name or None,
+        'interfaces': [args.interface],
+        'http_host': args.http_host,
+        'http_port': args.http_port,
+        'http_password': args.http_password,
+        'rc_host': args.rc_host,
+        'rc_port': args.rc_port,
+    }}, path=path, status_ttl=args.status_ttl)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
@@ -0,0 +1,126 @@
+"""
+Lightweight client for the python3-vlc control daemon.
+
+This module only needs the standard library 'socket' and 'json' modules, so
+    short lived command line calls like 'python -m vlc seek 30' don't pay for
+    importing vlc.py and requests. Only 'python -m vlc daemon' loads vlc.py.
+"""
+
+import json
+import os
+import socket
+import sys
+
+DAEMON_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR', '/tmp'),
+                             'python3-vlc-%i.sock' % os.getuid())
+
+USAGE = """\
+usage: python -m vlc [--socket PATH] [--instance NAME] COMMAND [ARGS ...]
+       python -m vlc [--socket PATH] [--instance NAME] daemon [OPTIONS ...]
+
+'python -m vlc daemon' starts the daemon, every other call sends one
+    command to it, e.g. 'python -m vlc seek 30'.
+    Run 'python -m vlc daemon --help' for the daemon options."""
+
+
+class DaemonError(Exception):
+    """Error reported by the VLC control daemon."""
+
+
+class VLCClient:
+    """Client for a running VLCDaemon."""
+
+    def __init__(self, path: str=DAEMON_SOCKET, instance='default') -> None:
+        """Connect to the daemon at unix socket <path>."""
+        self.INSTANCE = instance
+        self.SOCK = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.SOCK.connect(path)
+        except OSError:
+            self.SOCK.close()
+            raise
+        self._rfile = self.SOCK.makefile('rb')
+
+    def call(self, method: str, *args, **kwargs):
+        """Call VLC.<method> on the daemon and return its result."""
+        request = {
+            'instance': self.INSTANCE,
+            'method': method,
+            'args': args,
+            'kwargs': kwargs,
+        }
+        self.SOCK.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = self._rfile.readline()
+        if not line:
+            raise DaemonError("Daemon closed the connection.")
+        answer = json.loads(line.decode('utf-8'))
+        if 'error' in answer:
+            raise DaemonError(answer['error'])
+        return answer['result']
+
+    def close(self):
+        """Close the connection to the daemon."""
+        self._rfile.close()
+        self.SOCK.close()
+
+
+def _cli_value(arg: str):
+    """Turn a command line argument into a number, bool or string."""
+    try:
+        return json.loads(arg)
+    except ValueError:
+        return arg
+
+
+def main(argv=None):
+    """
+    Command line interface, run with: python -m vlc.
+
+    The global options are parsed by hand, so sending a command doesn't
+        import argparse either.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    path, instance = DAEMON_SOCKET, 'default'
+    while argv and argv[0] in ('--socket', '--instance'):
+        if len(argv) < 2:
+            print("python -m vlc: %s needs a value" % argv[0],
+                  file=sys.stderr)
+            return 2
+        if argv[0] == '--socket':
+            path = argv[1]
+        else:
+            instance = argv[1]
+        argv = argv[2:]
+    if not argv or argv[0] in ('-h', '--help'):
+        print(USAGE)
+        return 0 if argv else 2
+
+    command, args = argv[0], argv[1:]
+    if command == 'daemon':
+        try:
+            from . import vlc
+        except ImportError:
+            import vlc
+        return vlc.serve(args, path=path, instance=instance)
+
+    try:
+        client = VLCClient(path, instance=instance)
+    except OSError as e:
+        print("python -m vlc: no daemon at %s (%s), start one with "
+              "'python -m vlc daemon'" % (path, e.strerror or e),
+              file=sys.stderr)
+        return 1
+    try:
+        result = client.call(command, *[_cli_value(arg) for arg in args])
+    except (DaemonError, OSError) as e:
+        print("python -m vlc: %s" % e, file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    if result is not None:
+        print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())